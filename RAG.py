@@ -1,45 +1,286 @@
 from sentence_transformers import SentenceTransformer
-import faiss 
 import numpy as np 
 from llm_helper import query_llm
+from llm_scheduler import BACKGROUND, INTERACTIVE
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from bm25 import BM25Index, reciprocal_rank_fusion, top_k
+from vector_store import VectorStore, bitmap_to_mask
+from mmr import mmr_select
+from chunking import chunk_documents
+from summary_tree import is_global_question
+from cancellation import CANCELLED
+from compression import SentenceCompressor
+
+# Fixed instruction block: the start of every chat prompt's cacheable prefix
+CHAT_INSTRUCTIONS = """You are a research assistant.
+Use the provided sources to answer the question.
+Cite sources as (Doc 1, Doc 2)."""
 
 class RAGPipeline:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-      self.embedder = SentenceTransformer(model_name)
-      self.index = None
+    def __init__(self, model_name="all-MiniLM-L6-v2", hybrid=False, pool_size=50, reranker=None,
+                 embedder=None, precision="float32", mmr_lambda=None, fetch_k=20, cache=None):
+      # Pass the EmbedCluster model as `embedder` to avoid loading it twice
+      self.embedder = embedder if embedder is not None else SentenceTransformer(model_name)
+      self.store = VectorStore(precision=precision)
       self.docs = []
+      # Indexed units: the documents themselves, or their chunks (small-to-big mode)
+      self.units = []
+      self.chunks = None
+      # Hybrid mode fuses dense (FAISS) and lexical (BM25) rankings with RRF
+      self.hybrid = hybrid
+      self.pool_size = pool_size
+      self.bm25 = None
+      # Optional CrossEncoderReranker applied to a larger candidate pool
+      self.reranker = reranker
+      # Optional MMR diversification: pick k of the top `fetch_k` (lambda=1 is pure relevance)
+      self.mmr_lambda = mmr_lambda
+      self.fetch_k = fetch_k
+      # Optional SemanticCache in front of answer(); may be shared between sessions
+      self.cache = cache
+      self.version = None
+      # Optional SummaryTree: global questions also retrieve cluster/review summaries
+      self.summary_tree = None
+      self.summary_k = 2
+      # Trims sources to their most relevant sentences when config["compress_tokens"] is set
+      self.compressor = SentenceCompressor(self.embedder)
     
-    def build_index(self, documents):
+    @property
+    def index(self):
+       return self.store.index
+
+    def build_index(self, documents, store=None, chunk_words=None):
+       """Index `documents`. Pass an already-built VectorStore over the same documents
+       (e.g. EmbedCluster.store) to share it instead of encoding and storing them again.
+
+       With `chunk_words`, documents are split into chunks of about that many words:
+       retrieval matches chunks, and each hit is expanded to its neighbouring chunks
+       (or its whole section when short) before going into the prompt."""
        self.docs = documents
-       vectors = self.embedder.encode(documents, convert_to_numpy=True)
-       dim = vectors.shape[1]
+       self.chunks = chunk_documents(documents, chunk_words) if chunk_words else None
+       self.units = documents if self.chunks is None else self.chunks.texts
+       if store is not None:
+           if self.chunks is not None:
+               raise ValueError("A shared store indexes whole documents; it can't be used with chunk_words.")
+           self.store = store
+       else:
+           vectors = self.embedder.encode(self.units, convert_to_numpy=True, normalize_embeddings=True)
+           self.store.build(vectors)
 
-       self.index = faiss.IndexFlatL2(dim)
-       self.index.add(vectors)
+       # Content-based version: identical corpora share cached answers, any change invalidates them
+       digest = hashlib.sha1(f"{self.store.precision}:{chunk_words}".encode())
+       for doc in documents:
+           digest.update(doc.encode("utf-8", "ignore"))
+           digest.update(b"\0")
+       self.version = digest.hexdigest()
+
+       if self.hybrid:
+           self.bm25 = BM25Index().build(self.units)
     
-    def query(self, question: str, k=5):
+    def query(self, question: str, k=5, allowed=None):
+       """Top-k (doc, score). `allowed` is an optional packed row bitmap
+       (PaperStore.filter_bitmap) restricting which documents can be returned."""
+       return self.query_many([question], k, allowed=allowed)[0]
+
+    def query_many(self, questions, k=5, allowed=None, q_vecs=None):
+       """`query` for a batch: questions are encoded together and searched with
+       one matrix search (and one sparse BM25 product). Results are in input order."""
        if self.index is None:
             raise ValueError("Index not built yet.")
-       
-       q_vec = self.embedder.encode([question], convert_to_numpy=True)
-       distances, indices = self.index.search(q_vec, k=k)
+       if not questions:
+           return []
+
+       if q_vecs is None:
+           q_vecs = self._encode(questions)
+       if allowed is not None and self.chunks is not None:
+           # Filters are per document; every chunk inherits its parent's bit
+           allowed = np.packbits(bitmap_to_mask(allowed, len(self.docs))[self.chunks.parent], bitorder="little")
+       keep = k if self.mmr_lambda is None else max(self.fetch_k, k)
+       pool = keep if self.reranker is None else max(self.reranker.pool_size(k), keep)
+       candidates = self._retrieve_many(questions, q_vecs, pool, allowed)
+
+       results = []
+       for question, q_vec, ranked in zip(questions, q_vecs, candidates):
+           if self.reranker is not None:
+               passages = [self.units[i] for i, _ in ranked]
+               ranked = [(ranked[j][0], score) for j, score in self.reranker.rerank(question, passages, keep)]
+
+           if self.mmr_lambda is not None and len(ranked) > k:
+               # Relevance from the ranking so far (fused / reranked scores); the stored
+               # vectors (no re-encoding) only measure redundancy between candidates
+               cand_vecs = self.store.vectors([i for i, _ in ranked])
+               picked = mmr_select(self.store.prepare(q_vec[None, :]), cand_vecs, k, self.mmr_lambda,
+                                   relevance=np.array([score for _, score in ranked]))
+               ranked = [ranked[j] for j in picked]
+
+           results.append(self._expand(ranked, k))
+
+       if self.summary_tree is not None:
+           # Whole-review questions: lead with summary nodes, keep the best documents after them
+           global_rows = [i for i, q in enumerate(questions) if is_global_question(q)]
+           if global_rows:
+               node_hits = self.summary_tree.search(q_vecs[global_rows], self.summary_k)
+               for i, nodes in zip(global_rows, node_hits):
+                   results[i] = nodes + results[i][:max(k - len(nodes), 1)]
+       return results
+
+    def _expand(self, ranked, k):
+       """Ranked unit ids -> up to k (text, score) hits. In chunked mode each chunk
+       grows to its span; spans overlapping an earlier hit are merged into it."""
+       if self.chunks is None:
+           return [(self.docs[i], score) for i, score in ranked[:k]]
+
+       spans, scores = [], []
+       for i, score in ranked:
+           start, end = self.chunks.span(i)
+           for j, (s, e) in enumerate(spans):
+               if start < e and s < end:
+                   spans[j] = (min(s, start), max(e, end))
+                   break
+           else:
+               if len(spans) == k:
+                   break
+               spans.append((start, end))
+               scores.append(score)
+       return [(self.chunks.text(s, e), score) for (s, e), score in zip(spans, scores)]
 
-       hits = [(self.docs[i], float(distances[0][j])) for j, i in enumerate(indices[0])]
-       return hits
+    def _retrieve_many(self, questions, q_vecs, k: int, allowed=None):
+       """First-stage retrieval: per question, top-k (doc id, score) from FAISS, or FAISS + BM25 fused."""
+       mask = None
+       n = self.index.ntotal
+       if allowed is not None:
+           mask = bitmap_to_mask(allowed, n)
+           n = int(mask.sum())
+           if n == 0:
+               return [[] for _ in questions]
+       k = min(k, n)
+
+       if not self.hybrid:
+           # Scores are cosine similarities (higher is better)
+           scores, indices = self.store.search(q_vecs, k, allowed=allowed)
+           return [[(int(i), float(row_scores[j])) for j, i in enumerate(row) if i >= 0]
+                   for row_scores, row in zip(scores, indices)]
+
+       # Hybrid: fuse a larger dense pool with the BM25 pool
+       pool = min(max(self.pool_size, k), n)
+       _, dense_ids = self.store.search(q_vecs, pool, allowed=allowed)
+       lexical_scores = self.bm25.scores_many(questions)
+       if mask is not None:
+           lexical_scores[:, ~mask] = 0
+       fused = []
+       for dense_row, lexical_row in zip(dense_ids, lexical_scores):
+           lexical_ids, _ = top_k(lexical_row, pool)
+           fused.append(reciprocal_rank_fusion([dense_row[dense_row >= 0], lexical_ids], k=k))
+       return fused
     
-    def answer(self, question: str, config: dict, k=5):
-         hits = self.query(question, k)
-         context = "\n\n".join([f"Doc {i+1}: {doc}" for i, (doc, _) in enumerate(hits)])
-         
-         prompt = f"""You are a research assistant. 
-         Use the provided abstracts to answer the question.
-         Cite sources as (Doc 1, Doc 2).
-         
-         Question: {question}
-         
-         Context:
-         {context}
-         """
-
-         answer = query_llm(prompt, config)
-         return answer, hits
\ No newline at end of file
+    def _encode(self, questions):
+       return self.embedder.encode(list(questions), convert_to_numpy=True, normalize_embeddings=True)
+
+    def _cache_scope(self, k, allowed, config):
+       # Everything besides the question that changes the answer
+       return (k, None if allowed is None else allowed.tobytes(),
+               config.get("provider"), config.get("model"), self.hybrid, self.mmr_lambda,
+               self.reranker is not None, self.store.nprobe,
+               None if self.summary_tree is None else self.summary_tree.version,
+               config.get("compress_tokens"))
+
+    def _compress(self, docs, q_vec, config, share=1.0):
+       """`docs` cut to their sentences closest to the question, within
+       config["compress_tokens"] (times `share`); unchanged when unset."""
+       budget = config.get("compress_tokens")
+       if not budget or not docs:
+           return list(docs)
+       return self.compressor.compress(docs, max(1, int(budget * share)), target=q_vec)
+
+    def answer(self, question: str, config: dict, k=5, allowed=None, memory=None, token=None,
+               priority=INTERACTIVE):
+         """Answer one question. With a ConversationMemory, follow-ups are retrieved
+         with a history-aware query and the prompt carries the compressed history;
+         the turn is then recorded in `memory`. A cancelled or expired `token`
+         (cancellation.CancelToken) abandons the question and leaves `memory` as is."""
+         if memory is None or memory.is_empty():
+             result = self.answer_many([question], config, k=k, allowed=allowed, max_workers=1, token=token,
+                                       priority=priority)[0]
+             if memory is not None and not (token is not None and token.cancelled):
+                 # Pin the sources exactly as that prompt showed them (compression is deterministic)
+                 q_vec = self._encode([question])[0]
+                 memory.context_docs(result[1], lambda new: self._compress(new, q_vec, config))
+         else:
+             # History-dependent answers bypass the semantic cache
+             retrieval_query = memory.rewrite_query(question)
+             hits = self.query(retrieval_query, k, allowed=allowed)
+             if token is not None and token.cancelled:
+                 return CANCELLED, []
+             # Earlier turns' sources stay first (as first shown) so the prompt prefix repeats
+             q_vec = self._encode([retrieval_query])[0]
+             docs, relevant = memory.context_docs(
+                 hits, lambda new: self._compress(new, q_vec, config, share=len(new) / max(len(hits), 1)))
+             prefix, suffix = self._prompt(question, hits, memory.context_block(), docs, relevant)
+             result = (query_llm(suffix, config, priority=priority, token=token, kind="chat", prefix=prefix), hits)
+
+         if memory is not None and not (token is not None and token.cancelled):
+             memory.add_turn(question, result[0], result[1], config)
+         return result
+
+    def answer_many(self, questions, config: dict, k=5, allowed=None, max_workers=4, token=None,
+                    priority=BACKGROUND):
+         """Batch retrieval via query_many, then generation fanned out over at most
+         `max_workers` concurrent LLM calls at `priority` (an llm_scheduler class;
+         batches default to BACKGROUND so they never hold up a chat answer).
+         Returns [(answer, hits)] in input order.
+         A question close enough to an already answered one is served from the
+         cache, but only if it retrieved the very same sources: "results on
+         DS-0007" and "results on DS-0150" embed alike yet must not share answers."""
+         if not questions:
+             return []
+         q_vecs = self._encode(questions)
+         all_hits = self.query_many(questions, k, allowed=allowed, q_vecs=q_vecs)
+         scope = self._cache_scope(k, allowed, config)
+         scopes = [scope + (self._hits_digest(hits),) for hits in all_hits]
+         results = [None] * len(questions)
+         if self.cache is not None:
+             for i, q_vec in enumerate(q_vecs):
+                 results[i] = self.cache.lookup(q_vec, self.version, scopes[i])
+
+         todo = [i for i, r in enumerate(results) if r is None]
+         if todo:
+             prompts = [self._prompt(questions[i], all_hits[i],
+                                     docs=self._compress([doc for doc, _ in all_hits[i]], q_vecs[i], config))
+                        for i in todo]
+             with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                 # A cancelled token short-circuits each call before it is sent
+                 answers = list(pool.map(lambda p: query_llm(p[1], config, priority=priority, token=token,
+                                                             kind="chat", prefix=p[0]), prompts))
+             for i, answer in zip(todo, answers):
+                 results[i] = (answer, all_hits[i])
+                 if self.cache is not None and not answer.startswith("Error"):
+                     self.cache.store(q_vecs[i], self.version, scopes[i], answer, all_hits[i])
+         return results
+
+    @staticmethod
+    def _hits_digest(hits):
+         # Identity of the retrieved top-k (in order), for the cache scope
+         digest = hashlib.sha1()
+         for doc, _ in hits:
+             digest.update(doc.encode("utf-8", "ignore"))
+             digest.update(b"\0")
+         return digest.hexdigest()
+
+    def _prompt(self, question: str, hits, history: str = "", docs=None, relevant=None):
+         """(prefix, suffix). The prefix holds the instructions and the numbered
+         sources and is byte-identical whenever the sources are, so providers can
+         cache it; history and the question form the small variable suffix.
+         `docs` replaces the hits' texts (compressed, or a conversation's pinned
+         sources); `relevant` then gives the positions of this question's hits."""
+         docs = [doc for doc, _ in hits] if docs is None else docs
+         context = "\n\n".join([f"Doc {i+1}: {doc}" for i, doc in enumerate(docs)])
+         prefix = f"{CHAT_INSTRUCTIONS}\n\nSources:\n{context}\n\n"
+
+         suffix = ""
+         if history:
+             suffix += f"Conversation so far:\n{history}\n\n"
+         if relevant is not None and len(docs) > len(hits):
+             listed = ", ".join(f"Doc {i + 1}" for i in relevant)
+             suffix += f"Most relevant sources for this question: {listed}\n"
+         suffix += f"Question: {question}"
+         return prefix, suffix
\ No newline at end of file
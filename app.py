@@ -1,25 +1,53 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+import numpy as np
+import uuid
+import threading
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+try:
+    # Private Streamlit module (requirements.txt pins the tested range); without
+    # it RerunToken only honours its deadline
+    from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType
+except ImportError:
+    ScriptRequestType = None
 
 # --- CUSTOM MODULES ---
 from Arxiv import fetch_papers
 from embeddings import EmbedCluster
 from summarizer import summarize_cluster
 from RAG import RAGPipeline
+from reranker import CrossEncoderReranker
+from semantic_cache import SemanticCache
+from conversation import ConversationMemory
+from summary_tree import SummaryTree
+from extractive import extractive_summaries
+from synthesis_worker import SynthesisPrefetcher, content_digest
+from extraction import FIELDS, ExtractionCache, extract_fields
 from pdf_loader import parse_pdf  # ensure pdf_loader.py exists
+from paper_store import PaperStore
+from llm_scheduler import scheduler
+from llm_helper import CALL_OPTIONS, gemini_prefixes, router, single_flight, warmup
+from cancellation import CANCELLED, CancelToken
 # from llm_helper import query_llm # (Internal use only, imported by summarizer/RAG)
 
 st.set_page_config(page_title="Research Copilot 3.0", layout="wide", page_icon="🎓")
 
 # --- SESSION STATE INITIALIZATION ---
-if "papers" not in st.session_state: st.session_state.papers = []
+if "papers" not in st.session_state: st.session_state.papers = None
 if "rag" not in st.session_state: st.session_state.rag = None
 if "labels" not in st.session_state: st.session_state.labels = []
 if "coords" not in st.session_state: st.session_state.coords = []
+if "centroids" not in st.session_state: st.session_state.centroids = None
+if "themes" not in st.session_state: st.session_state.themes = {}
+if "representatives" not in st.session_state: st.session_state.representatives = {}
+if "synthesis_digests" not in st.session_state: st.session_state.synthesis_digests = {}
+if "prefetch_keys" not in st.session_state: st.session_state.prefetch_keys = []
 if "messages" not in st.session_state: st.session_state.messages = []
+if "memory" not in st.session_state: st.session_state.memory = ConversationMemory()
 if "trigger_run" not in st.session_state: st.session_state.trigger_run = False
 if "data_processed" not in st.session_state: st.session_state.data_processed = False
+if "session_id" not in st.session_state: st.session_state.session_id = uuid.uuid4().hex
+if "chat_token" not in st.session_state: st.session_state.chat_token = None
 
 # --- SIDEBAR CONFIGURATION ---
 with st.sidebar:
@@ -35,13 +63,33 @@ with st.sidebar:
         if not api_key:
             st.warning("⚠️ API Key missing")
     
+    failover = st.checkbox("Fall back to the other provider", value=True,
+                           help="If the selected engine errors, times out or is slow, retry on the other one: "
+                                "local Ollama for Gemini, Gemini for Ollama when a fallback key is entered.")
+    if failover and llm_provider == "Ollama (Local)":
+        api_key = st.text_input("Google API Key (fallback)", type="password",
+                                help="Optional. Lets Gemini answer while Ollama is down or overloaded.") or None
+
     # Global Config Dictionary
     llm_config = {
         "provider": "Gemini" if "Gemini" in llm_provider else "Ollama",
         "model": "gemini-2.5-flash" if "Gemini" in llm_provider else "gemma3:latest",
-        "api_key": api_key
+        "api_key": api_key,
+        "session_id": st.session_state.session_id,
+        "failover": failover
     }
 
+    if llm_config["provider"] == "Ollama":
+        with st.expander("Ollama Tuning"):
+            num_ctx = st.number_input("Context length", 2048, 32768, CALL_OPTIONS["chat"]["num_ctx"], step=2048,
+                                      help="Shared by all calls; changing it reloads the model.")
+            chat_tokens = st.number_input("Chat max tokens", 128, 4096, CALL_OPTIONS["chat"]["num_predict"], step=128)
+            synth_tokens = st.number_input("Synthesis max tokens", 128, 4096,
+                                           CALL_OPTIONS["synthesis"]["num_predict"], step=128)
+        llm_config["options"] = {kind: {"num_ctx": num_ctx} for kind in CALL_OPTIONS}
+        llm_config["options"]["chat"]["num_predict"] = chat_tokens
+        llm_config["options"]["synthesis"]["num_predict"] = synth_tokens
+
     st.divider()
     
     st.header("📂 2. Data Sources")
@@ -55,17 +103,122 @@ with st.sidebar:
     with st.expander("Advanced Search Settings"):
         max_paper = st.slider("Max Arxiv Results", 10, 100, 25, step=5)
         n_clusters = st.slider("Number of Clusters", 2, 8, 4)
+        nprobe = st.slider("Clusters Searched per Question", 1, 8, 8,
+                           help="Below the number of clusters, chat retrieval only scans the closest themes.")
         summary_style = st.radio("Summary Style", ["Bullets", "Paragraph"])
+        precision = st.selectbox("Vector Precision", ["float32", "float16", "int8", "pq"],
+                                 help="Compressed modes hold larger corpora in memory at a small recall cost.")
+        prefetch = st.checkbox("Pre-generate theme syntheses", value=False,
+                               help="After the analysis, synthesizes every theme in the background. "
+                                    "Chat requests always go first.")
+        diversify = st.checkbox("Diversify chat sources (MMR)", value=True,
+                                help="Avoids near-duplicate abstracts in the answer context.")
+        use_rerank = st.checkbox("Rerank chat sources (cross-encoder)", value=False,
+                                 help="Scores a larger candidate pool with a CPU cross-encoder. Slower, more precise.")
+        compress = st.select_slider("LLM context budget (tokens)", ["Off", 300, 600, 1200], value="Off",
+                                    help="Keeps only the sentences closest to the question (chat) or the theme "
+                                         "(synthesis). Shorter prompts answer faster; tight budgets can drop details.")
+    llm_config["compress_tokens"] = None if compress == "Off" else compress
 
     st.divider()
     
     if st.button("🚀 Run Research Analysis", type="primary"):
         st.session_state.trigger_run = True
 
+    with st.expander("LLM Queue"):
+        llm_stats = scheduler.stats()
+        for provider, q in sorted(llm_stats["providers"].items()):
+            st.caption(f"**{provider}**: {q['running']}/{q['limit']} running, {q['queued']} queued")
+        for name, lat in llm_stats["latency"].items():
+            st.caption(f"{name}: p50 {lat['p50']/1000:.1f}s · p95 {lat['p95']/1000:.1f}s "
+                       f"(queue p95 {lat['wait_p95']/1000:.1f}s, {lat['calls']} calls)")
+        for backend, h in router.stats().items():
+            latency = f", p95 {h['p95']:.1f}s" if h["p95"] is not None else ""
+            st.caption(f"{backend}: circuit {h['state']}, {h['error_rate']:.0%} errors{latency}")
+        dedup = single_flight.stats()
+        st.caption(f"Saved {dedup['saved']} of {dedup['calls']} calls "
+                   f"({dedup['coalesced']} joined in-flight, {dedup['cache_hits']} cached)")
+        compressor = st.session_state.rag.compressor if st.session_state.rag is not None else None
+        if compressor is not None and compressor.tokens_in:
+            st.caption(f"Context compression: {compressor.tokens_out:,} of {compressor.tokens_in:,} "
+                       f"source tokens sent ({compressor.tokens_out / compressor.tokens_in:.0%})")
+        if gemini_prefixes.created:
+            st.caption(f"Gemini context caches: {gemini_prefixes.created} created, {gemini_prefixes.hits} reused")
+
 # --- CORE PIPELINE LOGIC ---
+@st.cache_resource
+def load_reranker():
+    return CrossEncoderReranker()
+
+@st.cache_resource
+def load_answer_cache():
+    # Shared by every session; entries are keyed by index content, so only
+    # users looking at the same corpus reuse each other's answers
+    return SemanticCache(threshold=0.92)
+
+@st.cache_resource
+def load_extraction_cache():
+    # Shared across sessions and re-runs: only papers not seen before are sent
+    return ExtractionCache()
+
+@st.cache_resource
+def load_prefetcher():
+    # One background pool per server; results are keyed by content, style and model
+    return SynthesisPrefetcher(max_workers=2)
+
+@st.cache_resource
+def warm_ollama(model, num_ctx):
+    # Once per model/context length per server, off the UI thread: loads the weights
+    # so the first question does not pay for it
+    thread = threading.Thread(target=warmup, args=(model, num_ctx), daemon=True)
+    thread.start()
+    return thread
+
+if llm_config["provider"] == "Ollama":
+    warm_ollama(llm_config["model"], num_ctx)
+
+def cancel_chat():
+    # The previous question's run was abandoned (new question / new analysis): free its LLM slot
+    if st.session_state.chat_token is not None:
+        st.session_state.chat_token.cancel()
+
+class RerunToken(CancelToken):
+    """A CancelToken that also fires once this run is superseded: a new chat
+    question, or any rerun of the whole app or of the running fragment.
+    Streamlit only acts on a rerun at the script's next st.* call, which never
+    comes while the script thread waits on the LLM, so the LLM wait loops
+    (scheduler, router, single-flight, streaming) poll for it through here."""
+
+    def __init__(self, timeout_s=None):
+        super().__init__(timeout_s)
+        self.ctx = get_script_run_ctx()
+
+    @property
+    def superseded(self) -> bool:
+        if ScriptRequestType is None or self.ctx is None:
+            return False
+        try:
+            # Private Streamlit state; without it only the deadline applies
+            requests = self.ctx.script_requests
+            if requests._state == ScriptRequestType.STOP:
+                return True
+            if requests._state != ScriptRequestType.RERUN:
+                return False
+            rerun = requests._rerun_data
+            targets = set(rerun.fragment_id_queue or []) | ({rerun.fragment_id} if rerun.fragment_id else set())
+            return not targets or bool(targets & set(self.ctx.fragment_ids_this_run or []))
+        except AttributeError:
+            return False
+
+    @property
+    def cancelled(self) -> bool:
+        return super().cancelled or self.superseded
+
 def run_pipeline():
     # Clear Chat History on new run
+    cancel_chat()
     st.session_state.messages = []
+    st.session_state.memory = ConversationMemory()
     
     with st.status("🤖 AI Agent Working...", expanded=True) as status:
         
@@ -98,34 +251,64 @@ def run_pipeline():
         status.write(f"Analyzing {len(all_papers)} documents...")
         texts = [p["summary"] for p in all_papers]
         
-        ec = EmbedCluster()
+        ec = EmbedCluster(precision=precision)
         ec.fit(texts, all_papers)
         
         # Safe clustering: Ensure we don't ask for more clusters than papers
         actual_k = min(n_clusters, len(all_papers))
-        labels, _ = ec.kmeans(k=actual_k)
+        labels, centroids = ec.kmeans(k=actual_k)
+        if nprobe < len(centroids):
+            ec.route_by_clusters(nprobe=nprobe)
         
         # Reduce dimensions for visualization
         coords = ec.reduce_dimensions()
+
+        # Instant theme labels and key sentences (no LLM call)
+        themes = extractive_summaries(texts, labels, ec.embeddings, centroids)
+        # Synthesis input per theme: papers near the centroid, de-duplicated
+        representatives = {int(c): ec.representatives(c) for c in np.unique(labels)}
+        # Hashed once here, not on every render of the synthesis tab
+        digests = {c: content_digest([texts[i] for i in rows]) for c, rows in representatives.items()}
         
-        # Assign cluster labels back to papers
-        for i, p in enumerate(all_papers):
-            p["cluster"] = int(labels[i])
-            # Default short summary is just title until AI generates one
-            p["short_summary"] = p["title"]
+        # Columnar store with cluster labels attached
+        store = PaperStore.from_records(all_papers, clusters=labels)
 
         # 5. Build RAG Index
         status.write("Building Knowledge Base...")
-        rag = RAGPipeline()
-        rag.build_index(texts)
+        rag = RAGPipeline(hybrid=True, reranker=load_reranker() if use_rerank else None, embedder=ec.model,
+                          precision=precision, mmr_lambda=0.7 if diversify else None, cache=load_answer_cache())
+        if any(p.get("text") for p in all_papers):
+            # Full texts (uploads): match small chunks, expand to their context when answering
+            rag.build_index([p.get("text") or p["summary"] for p in all_papers], chunk_words=120)
+            if nprobe < len(centroids):
+                rag.store.route(centroids, nprobe=nprobe)
+        else:
+            rag.build_index(texts, store=ec.store)  # share the clustering index, no second copy
 
         # 6. Save State
-        st.session_state.papers = all_papers
+        st.session_state.papers = store
         st.session_state.rag = rag
         st.session_state.labels = labels
         st.session_state.coords = coords
+        st.session_state.centroids = centroids
+        st.session_state.themes = themes
+        st.session_state.representatives = representatives
+        st.session_state.synthesis_digests = digests
         st.session_state.data_processed = True
         
+        # 7. Optional: speculative synthesis of every theme, low priority
+        prefetcher = load_prefetcher()
+        previous_keys = st.session_state.prefetch_keys
+        st.session_state.prefetch_keys = []
+        if prefetch and not (llm_config["provider"] == "Gemini" and not llm_config["api_key"]):
+            st.session_state.prefetch_keys = [
+                prefetcher.submit([texts[i] for i in rows], summary_style, llm_config, compressor=rag.compressor,
+                                  digest=digests[c])
+                for c, rows in representatives.items()
+            ]
+        # After submitting, so themes unchanged since the last run keep their running job
+        prefetcher.cancel(previous_keys, session=st.session_state.session_id)
+        
         status.update(label="Research Complete!", state="complete", expanded=False)
 
 # Trigger Handling
@@ -134,62 +317,92 @@ if st.session_state.trigger_run:
     st.session_state.trigger_run = False
 
 # --- UI RENDERING ---
-if st.session_state.data_processed:
-    papers = st.session_state.papers
-    rag = st.session_state.rag
-    labels = st.session_state.labels
-    coords = st.session_state.coords
+# Each tab is a fragment: interacting with one (e.g. a chat turn) reruns only
+# that fragment instead of the whole script, so the map and the cluster
+# expanders are not rebuilt on every question.
 
-    # Dynamic Title
-    display_title = f"📚 Analysis: {query}" if query else "📚 Analysis: Local Files"
-    st.title(display_title)
+@st.fragment
+def render_map(papers, coords):
+    col1, col2 = st.columns([3, 1])
+    with col1:
+         # Prepare plotting data (Arrow-backed, straight from the paper store)
+         plot_df = papers.plot_frame(coords)
+         
+         # Visualize with distinction between Uploads and Arxiv
+         fig = px.scatter(
+             plot_df, x="x", y="y", color="cluster", symbol="source",
+             hover_data=["title", "year"],
+             title="Semantic Research Landscape",
+             template="plotly_dark",
+             size_max=12
+         )
+         st.plotly_chart(fig, use_container_width=True)
+         
+    with col2:
+        st.metric("Total Documents", len(papers))
+        st.metric("Clusters Found", len(papers.group("cluster")))
+        st.markdown("### How to read this:")
+        st.caption("• **Dots close together** are semantically similar.")
+        st.caption("• **Colors** represent automated themes.")
+        st.caption("• **Shapes** distinguish Arxiv vs. Uploads.")
+
+@st.fragment
+def render_synthesis(papers, rag, themes, llm_config, summary_style):
+    st.subheader("Automated Literature Review")
+    st.info("💡 Each theme shows key terms and representative sentences right away. "
+            "Click 'Generate Synthesis' for an AI-written summary.")
     
-    tab1, tab2, tab3 = st.tabs(["🗺️ Cluster Map", "📝 Literature Review", "🧠 Q&A Assistant"])
+    clusters = papers.group("cluster")
 
-    # TAB 1: VISUALIZATION
-    with tab1:
-        col1, col2 = st.columns([3, 1])
-        with col1:
-             # Prepare plotting data
-             plot_df = pd.DataFrame({
-                 "x": coords[:, 0],
-                 "y": coords[:, 1],
-                 "title": [p["title"] for p in papers],
-                 "cluster": [str(c) for c in labels],
-                 "source": [p.get("source", "Arxiv") for p in papers],
-                 "year": [str(p["published"])[:4] if p["published"] != "Local File" else "Local" for p in papers]
-             })
-             
-             # Visualize with distinction between Uploads and Arxiv
-             fig = px.scatter(
-                 plot_df, x="x", y="y", color="cluster", symbol="source",
-                 hover_data=["title", "year"],
-                 title="Semantic Research Landscape",
-                 template="plotly_dark",
-                 size_max=12
-             )
-             st.plotly_chart(fig, use_container_width=True)
-             
-        with col2:
-            st.metric("Total Documents", len(papers))
-            st.metric("Clusters Found", len(set(labels)))
-            st.markdown("### How to read this:")
-            st.caption("• **Dots close together** are semantically similar.")
-            st.caption("• **Colors** represent automated themes.")
-            st.caption("• **Shapes** distinguish Arxiv vs. Uploads.")
+    # Summary tree (theme -> theme group -> whole review); the chat also uses it for global questions
+    if rag.summary_tree is None:
+        if st.button("🌳 Build Whole-Review Summary",
+                     help="Summarizes every theme once, then groups of themes, then the review. "
+                          "Afterwards questions about the whole review are answered in one call."):
+            if llm_config["provider"] == "Gemini" and not llm_config["api_key"]:
+                st.error("❌ Please enter a Google API Key in the sidebar.")
+            else:
+                with st.spinner("Summarizing themes and the whole review..."):
+                    all_texts = papers.texts()
+                    reps = st.session_state.representatives
+                    cluster_texts = {c: [all_texts[i] for i in reps.get(c, rows)] for c, rows in clusters.items()}
+                    try:
+                        rag.summary_tree = SummaryTree().build(
+                            cluster_texts, st.session_state.centroids,
+                            summarize=lambda texts: summarize_cluster(texts, style="Paragraph", config=llm_config,
+                                                                      compressor=rag.compressor),
+                            embedder=rag.embedder,
+                        )
+                    except RuntimeError as e:
+                        # No partial tree: the button stays so the build can be retried
+                        st.error(f"❌ Summary tree not built. {e}")
+    if rag.summary_tree is not None:
+        with st.expander("🌳 Whole-Review Summary", expanded=True):
+            st.markdown(rag.summary_tree.root)
 
-    # TAB 2: SYNTHESIS
-    with tab2:
-        st.subheader("Automated Literature Review")
-        st.info("💡 Click 'Generate Synthesis' to use the AI. This saves costs/time by not summarizing everything at once.")
+    all_texts = papers.texts()
+    prefetcher = load_prefetcher()
+    for c in sorted(clusters):
+        subset = papers.rows(clusters[c])
         
-        for c in sorted(set(labels)):
-            subset = [p for p in papers if p["cluster"] == c]
+        theme = themes.get(c, {"keywords": [], "sentences": []})
+        label = f"Theme {c+1}: " + ", ".join(theme["keywords"][:3]) if theme["keywords"] else f"Theme {c+1}"
+        with st.expander(f"📌 {label} ({len(subset)} documents)", expanded=False):
+            col_a, col_b = st.columns([3, 1])
             
-            with st.expander(f"📌 Theme {c+1} ({len(subset)} documents)", expanded=False):
-                col_a, col_b = st.columns([3, 1])
-                
-                with col_a:
+            with col_a:
+                if theme["keywords"]:
+                    st.markdown("**Key terms:** " + ", ".join(theme["keywords"]))
+                for sentence in theme["sentences"]:
+                    st.markdown(f"> {sentence}")
+
+                rows = st.session_state.representatives.get(c, clusters[c])
+                cluster_texts = [all_texts[i] for i in rows]
+                digest = st.session_state.synthesis_digests.get(c)
+                ready = prefetcher.get(cluster_texts, summary_style, llm_config, digest=digest)
+                if ready:
+                    st.success(ready)
+                else:
                     btn_key = f"btn_sum_{c}"
                     if st.button(f"Generate Synthesis for Theme {c+1}", key=btn_key):
                         # API Key Check
@@ -197,53 +410,133 @@ if st.session_state.data_processed:
                             st.error("❌ Please enter a Google API Key in the sidebar.")
                         else:
                             with st.spinner("Synthesizing insights..."):
-                                cluster_texts = [p["summary"] for p in subset]
-                                # Pass config to summarizer
-                                summary = summarize_cluster(cluster_texts, style=summary_style, config=llm_config)
+                                # Joins a background job for this theme if one is already running
+                                summary = prefetcher.result(cluster_texts, summary_style, llm_config,
+                                                            token=RerunToken(timeout_s=300),
+                                                            compressor=rag.compressor, digest=digest)
                                 st.success(summary)
-                    
-                    st.markdown("---")
-                    st.markdown("**Documents in this theme:**")
-                    for p in subset:
-                        link = p['pdf_url'] if p['pdf_url'] != "#" else "Local Upload"
-                        st.markdown(f"- **{p['title']}** [{link}]")
                 
-    # TAB 3: CHATBOT
-    with tab3:
-        st.subheader("Chat with your Knowledge Base")
-        
-        # Display History
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
+                st.markdown("---")
+                st.markdown("**Documents in this theme:**")
+                for p in subset:
+                    link = p['pdf_url'] if p['pdf_url'] != "#" else "Local Upload"
+                    st.markdown(f"- **{p['title']}** [{link}]")
 
-        # Chat Input
-        if prompt := st.chat_input("Ask a question about these papers..."):
-            
-            # API Key Check
+@st.fragment
+def render_table(papers, llm_config):
+    st.subheader("Methods, Datasets & Metrics")
+    cache = load_extraction_cache()
+    texts = papers.texts()
+
+    if not papers.has_columns(FIELDS):
+        new = len(cache.missing(texts, llm_config))
+        if new == 0:
+            # Every paper was extracted in an earlier run: no LLM call needed
+            papers.set_list_columns(extract_fields(texts, llm_config, cache), FIELDS)
+        elif st.button(f"Extract from {new} paper{'s' if new != 1 else ''}",
+                       help="Several abstracts per LLM call; results are reused on later runs."):
             if llm_config["provider"] == "Gemini" and not llm_config["api_key"]:
                 st.error("❌ Please enter a Google API Key in the sidebar.")
             else:
-                # User Message
-                st.session_state.messages.append({"role": "user", "content": prompt})
-                with st.chat_message("user"):
-                    st.markdown(prompt)
-
-                # AI Response
-                with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        try:
-                            # Pass config to RAG
-                            answer, hits = rag.answer(prompt, config=llm_config, k=4)
-                            st.markdown(answer)
-                            
-                            with st.expander("View Sources"):
-                                for doc_content, score in hits:
-                                    st.caption(f"**Score: {score:.2f}** | ...{doc_content[:150]}...")
-                            
-                            st.session_state.messages.append({"role": "assistant", "content": answer})
-                        except Exception as e:
-                            st.error(f"Error: {str(e)}")
+                with st.spinner("Extracting methods, datasets and metrics..."):
+                    papers.set_list_columns(extract_fields(texts, llm_config, cache), FIELDS)
+        else:
+            st.info("💡 Builds a comparison table of the methods, datasets and metrics each paper reports.")
+            return
+
+    if papers.has_columns(FIELDS):
+        counts = st.columns(len(FIELDS))
+        for col, field in zip(counts, FIELDS):
+            top = list(papers.value_counts(field).items())[:5]
+            col.markdown(f"**Top {field}:** " + (", ".join(f"{v} ({n})" for v, n in top) or "—"))
+        st.dataframe(papers.table_frame(list(FIELDS)), use_container_width=True, hide_index=True)
+
+@st.fragment
+def render_chat(papers, rag, llm_config):
+    st.subheader("Chat with your Knowledge Base")
+
+    # Optional filters, evaluated inside the vector/BM25 search (not post-filtered)
+    with st.expander("🔎 Filter Sources"):
+        f1, f2, f3 = st.columns(3)
+        sources = f1.multiselect("Source", sorted(papers.group("source")))
+        themes = f2.multiselect("Theme", sorted(papers.group("cluster")), format_func=lambda c: f"Theme {c+1}")
+        years = sorted(y for y in papers.group("year") if y is not None)
+        year_range = None
+        if len(years) > 1:
+            picked = f3.slider("Year", years[0], years[-1], (years[0], years[-1]),
+                               help="Narrowing the range excludes uploads (no publication date).")
+            if picked != (years[0], years[-1]):
+                year_range = picked
+    allowed = papers.filter_bitmap(source=sources or None, cluster=themes or None, year=year_range)
+    
+    # Display History
+    for msg in st.session_state.messages:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+    # Chat Input
+    if prompt := st.chat_input("Ask a question about these papers..."):
+        cancel_chat()
+        
+        # API Key Check
+        if llm_config["provider"] == "Gemini" and not llm_config["api_key"]:
+            st.error("❌ Please enter a Google API Key in the sidebar.")
+        else:
+            # User Message
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            # AI Response
+            with st.chat_message("assistant"):
+                with st.spinner("Thinking..."):
+                    try:
+                        # Pass config to RAG; a newer question (or any rerun) cancels this one
+                        token = st.session_state.chat_token = RerunToken(timeout_s=120)
+                        answer, hits = rag.answer(prompt, config=llm_config, k=4, allowed=allowed,
+                                                  memory=st.session_state.memory, token=token)
+                        if answer == CANCELLED:
+                            # A superseded run ends quietly and the pending rerun takes over
+                            if not token.superseded:
+                                st.warning("⏱️ No answer within two minutes. Try again or switch provider.")
+                            st.stop()
+                        st.markdown(answer)
+                        
+                        with st.expander("View Sources"):
+                            for doc_content, score in hits:
+                                st.caption(f"**Score: {score:.2f}** | ...{doc_content[:150]}...")
+                        
+                        st.session_state.messages.append({"role": "assistant", "content": answer})
+                    except Exception as e:
+                        st.error(f"Error: {str(e)}")
+
+if st.session_state.data_processed:
+    papers = st.session_state.papers
+    rag = st.session_state.rag
+    coords = st.session_state.coords
+
+    # Dynamic Title
+    display_title = f"📚 Analysis: {query}" if query else "📚 Analysis: Local Files"
+    st.title(display_title)
+    
+    tab1, tab2, tab3, tab4 = st.tabs(["🗺️ Cluster Map", "📝 Literature Review", "🧠 Q&A Assistant",
+                                      "📊 Comparison Table"])
+
+    # TAB 1: VISUALIZATION
+    with tab1:
+        render_map(papers, coords)
+
+    # TAB 2: SYNTHESIS
+    with tab2:
+        render_synthesis(papers, rag, st.session_state.themes, llm_config, summary_style)
+                
+    # TAB 3: CHATBOT
+    with tab3:
+        render_chat(papers, rag, llm_config)
+
+    # TAB 4: EXTRACTION TABLE
+    with tab4:
+        render_table(papers, llm_config)
 
 else:
     # EMPTY STATE
@@ -0,0 +1,187 @@
+"""Retrieval and prompt benchmarks on a synthetic fixture corpus.
+
+Run with:  python benchmark.py
+"""
+import time
+
+import faiss
+import numpy as np
+
+from conversation import ConversationMemory
+from tests.fake_llm import install as install_fake
+from RAG import RAGPipeline
+from summarizer import batch_summary
+from compression import SentenceCompressor
+from conversation import estimate_tokens
+from vector_store import VectorStore, compression_report
+
+TOPICS = [
+    "graph neural networks for molecular property prediction",
+    "transformer language models for protein sequences",
+    "reinforcement learning for de novo drug design",
+    "diffusion models for 3D molecule generation",
+    "contrastive pretraining of chemical representations",
+    "active learning for virtual screening",
+    "uncertainty estimation in binding affinity models",
+    "knowledge graphs for drug repurposing",
+]
+METHODS = ["message passing", "attention pooling", "graph transformers", "variational autoencoders",
+           "equivariant networks", "self-supervised pretraining", "Bayesian optimisation", "few-shot learning"]
+
+
+def fixture_corpus(n_docs: int = 2000, n_queries: int = 200, seed: int = 0):
+    """Abstracts that each mention one unique dataset code; queries ask for that code.
+
+    These are exactly the queries dense retrieval tends to miss: the
+    distinguishing token carries almost no semantic signal.
+    """
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i in range(n_docs):
+        topic = TOPICS[rng.integers(len(TOPICS))]
+        method = METHODS[rng.integers(len(METHODS))]
+        docs.append(
+            f"We study {topic} using {method}. "
+            f"Experiments on the DS-{i:04d} benchmark show improvements over strong baselines, "
+            f"and ablations highlight the role of {METHODS[rng.integers(len(METHODS))]}."
+        )
+    targets = rng.choice(n_docs, size=min(n_queries, n_docs), replace=False)
+    queries = [f"Which results are reported on DS-{t:04d}?" for t in targets]
+    return docs, queries, targets
+
+
+def recall_at_k(rag: RAGPipeline, queries, targets, k: int):
+    docs = rag.docs
+    found, latencies = 0, []
+    for question, target in zip(queries, targets):
+        start = time.perf_counter()
+        hits = rag.query(question, k=k)
+        latencies.append(time.perf_counter() - start)
+        found += any(doc == docs[target] for doc, _ in hits)
+    lat_ms = np.array(latencies) * 1000
+    return found / len(queries), float(np.median(lat_ms)), float(np.percentile(lat_ms, 95))
+
+
+def bench_hybrid(n_docs: int = 2000, k: int = 5):
+    docs, queries, targets = fixture_corpus(n_docs)
+    rag = RAGPipeline(hybrid=True)
+
+    start = time.perf_counter()
+    rag.build_index(docs)
+    print(f"Index build ({n_docs} docs, dense + BM25): {time.perf_counter() - start:.2f}s")
+
+    print(f"{'mode':<8} {'recall@' + str(k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in ("dense", "hybrid"):
+        rag.hybrid = mode == "hybrid"
+        recall, p50, p95 = recall_at_k(rag, queries, targets, k)
+        print(f"{mode:<8} {recall:>9.3f} {p50:>8.2f} {p95:>8.2f}")
+
+
+def bench_compression(n_docs: int = 2000, n_queries: int = 200, k: int = 10):
+    docs, queries, _ = fixture_corpus(n_docs, n_queries)
+    rag = RAGPipeline()
+    vectors = rag.embedder.encode(docs, convert_to_numpy=True, normalize_embeddings=True)
+    q_vecs = rag.embedder.encode(queries, convert_to_numpy=True, normalize_embeddings=True)
+
+    print(f"{'precision':<10} {'dims':>5} {'KiB':>8} {'saved':>7} {'recall@' + str(k):>10}")
+    for row in compression_report(vectors, q_vecs, k=k):
+        print(f"{row['precision']:<10} {row['dims']:>5} {row['bytes'] / 1024:>8.1f} "
+              f"{row['saved']:>7.1%} {row[f'recall@{k}']:>10.3f}")
+
+
+def bench_routing(n_docs: int = 2000, n_queries: int = 200, n_clusters: int = 16, k: int = 10):
+    docs, queries, _ = fixture_corpus(n_docs, n_queries)
+    rag = RAGPipeline()
+    vectors = rag.embedder.encode(docs, convert_to_numpy=True, normalize_embeddings=True)
+    q_vecs = rag.embedder.encode(queries, convert_to_numpy=True, normalize_embeddings=True)
+
+    exact = VectorStore().build(vectors)
+    _, truth = exact.search(q_vecs, k)
+    kmeans = faiss.Kmeans(vectors.shape[1], n_clusters, niter=25, spherical=True)
+    kmeans.train(vectors)
+    routed = VectorStore().build(vectors).route(kmeans.centroids)
+
+    print(f"{'nprobe':>6} {'recall@' + str(k):>10} {'us/query':>9}")
+    for nprobe in (1, 2, 4, n_clusters):
+        start = time.perf_counter()
+        for q in q_vecs:
+            routed.search(q[None, :], k, nprobe=nprobe)
+        per_query = (time.perf_counter() - start) / len(q_vecs) * 1e6
+        _, found = routed.search(q_vecs, k, nprobe=nprobe)
+        recall = np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+        print(f"{nprobe:>6} {recall:>10.3f} {per_query:>9.1f}")
+
+
+def bench_prefix_reuse(n_docs: int = 500, turns: int = 8, k: int = 4):
+    """Multi-turn chat against the offline Fake backend: share of prompt tokens a
+    server-side prefix (KV) cache can reuse, with and without pinned sources."""
+    docs, queries, targets = fixture_corpus(n_docs, turns)
+    # Follow-ups keep coming back to the first two papers, like a real conversation
+    queries = [queries[0], queries[1], "How do these two compare?"] + queries[2:]
+    rag = RAGPipeline(hybrid=True)
+    rag.build_index(docs)
+    config = {"provider": "Fake", "model": "fake"}
+
+    print(f"{'mode':>16} {'prefix hits':>12} {'reused tokens':>14}")
+    for label, memory in (("stateless", None), ("pinned sources", ConversationMemory())):
+        fake = install_fake()  # fresh response cache: no hits across modes
+        for question in queries:
+            rag.answer(question, config, k=k, memory=memory)
+        stats = fake.stats()
+        print(f"{label:>16} {stats['prefix_hits']:>6}/{stats['calls']:<5} {stats['reuse']:>14.1%}")
+
+
+def bench_packed_summaries(n_docs: int = 100):
+    """Per-paper summaries one abstract per call vs packed into JSON batches,
+    against the Fake backend with a simulated 200 ms round trip."""
+    docs, _, _ = fixture_corpus(n_docs, 1)
+    config = {"provider": "Fake", "model": "fake"}
+
+    print(f"{'pack':>5} {'calls':>6} {'wall s':>7}")
+    for pack in (1, 8, 16):
+        fake = install_fake(ms_per_call=200, ms_per_token=0.5)
+        start = time.perf_counter()
+        summaries = batch_summary(docs, config, pack=pack)
+        elapsed = time.perf_counter() - start
+        assert len(summaries) == n_docs and all(summaries)
+        print(f"{pack:>5} {fake.stats()['calls']:>6} {elapsed:>7.2f}")
+
+
+def bench_prompt_compression(n_docs: int = 2000, n_queries: int = 100, k: int = 5):
+    """Chat context size vs. quality under sentence-level compression. Quality
+    proxy: the prompt still contains the dataset code the question asks about
+    (whenever retrieval found it). Latency is the compression step itself."""
+    docs, queries, targets = fixture_corpus(n_docs, n_queries)
+    rag = RAGPipeline(hybrid=True)
+    rag.build_index(docs)
+    all_hits = rag.query_many(queries, k)
+    q_vecs = rag.embedder.encode(queries, convert_to_numpy=True, normalize_embeddings=True)
+    answerable = [i for i, hits in enumerate(all_hits) if any(doc == docs[targets[i]] for doc, _ in hits)]
+
+    print(f"{'budget':>7} {'tokens':>7} {'kept code':>10} {'ms/prompt':>10}")
+    for budget in (None, 200, 120, 60):
+        compressor = SentenceCompressor(rag.embedder)
+        tokens, kept, elapsed = [], 0, 0.0
+        for i in answerable:
+            sources = [doc for doc, _ in all_hits[i]]
+            start = time.perf_counter()
+            context = sources if budget is None else compressor.compress(sources, budget, target=q_vecs[i])
+            elapsed += time.perf_counter() - start
+            tokens.append(sum(estimate_tokens(c) for c in context))
+            kept += f"DS-{targets[i]:04d}" in " ".join(context)
+        n = max(len(answerable), 1)
+        print(f"{str(budget or 'off'):>7} {np.mean(tokens):>7.0f} {kept / n:>10.2f} {elapsed / n * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    bench_hybrid()
+    print()
+    bench_compression()
+    print()
+    bench_routing()
+    print()
+    bench_prefix_reuse()
+    print()
+    bench_packed_summaries()
+    print()
+    bench_prompt_compression()
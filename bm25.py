@@ -0,0 +1,105 @@
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Keeps identifiers like "GPT-4", "BRCA1", "QM9" or "ogbg-molhiv" as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in ENGLISH_STOP_WORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a sparse term-weight matrix.
+
+    The per-(doc, term) BM25 weights are precomputed at build time, so scoring a
+    query is just summing a few sparse columns.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.weights = None  # CSC matrix, shape (n_docs, n_terms)
+
+    def build(self, documents: Sequence[str]):
+        rows, cols, tfs = [], [], []
+        for doc_id, doc in enumerate(documents):
+            for term, tf in Counter(tokenize(doc)).items():
+                term_id = self.vocab.setdefault(term, len(self.vocab))
+                rows.append(doc_id)
+                cols.append(term_id)
+                tfs.append(tf)
+
+        n_docs = len(documents)
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float32)
+
+        doc_len = np.bincount(rows, weights=tf, minlength=n_docs).astype(np.float32)
+        avg_len = doc_len.mean() if n_docs else 0.0
+        df = np.bincount(cols, minlength=len(self.vocab)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        norm = self.k1 * (1 - self.b + self.b * doc_len[rows] / max(avg_len, 1e-9))
+        data = idf[cols] * tf * (self.k1 + 1) / (tf + norm)
+        self.weights = sparse.csc_matrix((data, (rows, cols)), shape=(n_docs, len(self.vocab)))
+        return self
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query (dense array)."""
+        if self.weights is None:
+            raise ValueError("Index not built yet.")
+        counts = Counter(t for t in tokenize(query) if t in self.vocab)
+        if not counts:
+            return np.zeros(self.weights.shape[0], dtype=np.float32)
+        term_ids = [self.vocab[t] for t in counts]
+        qtf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return np.asarray(self.weights[:, term_ids] @ qtf).ravel()
+
+    def scores_many(self, queries: Sequence[str]) -> np.ndarray:
+        """Scores for several queries at once: one sparse (docs x terms) @ (terms x queries) product."""
+        if self.weights is None:
+            raise ValueError("Index not built yet.")
+        rows, cols, data = [], [], []
+        for q_id, query in enumerate(queries):
+            for term, tf in Counter(t for t in tokenize(query) if t in self.vocab).items():
+                rows.append(self.vocab[term])
+                cols.append(q_id)
+                data.append(tf)
+        qtf = sparse.csc_matrix((np.asarray(data, dtype=np.float32), (rows, cols)),
+                                shape=(len(self.vocab), len(queries)))
+        return (self.weights @ qtf).toarray().T
+
+    def search(self, query: str, k: int = 5, mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (indices, scores), best first. Documents with no matching term, or
+        outside the boolean `mask` when given, are skipped."""
+        scores = self.scores(query)
+        if mask is not None:
+            scores = np.where(mask, scores, 0)
+        return top_k(scores, k)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order, scores[order]
+
+
+def reciprocal_rank_fusion(rankings: List[Sequence[int]], k: int = 5, c: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (c + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            doc_id = int(doc_id)
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (c + rank + 1)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Iterable, Optional
+
+CANCELLED = "Error: request cancelled."
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """Request-scoped cancellation with an optional deadline.
+
+    A token is cancelled explicitly (`cancel()`), when its deadline passes, or
+    when its parent is cancelled; child tokens let one branch of a request (a
+    hedged attempt) be stopped without stopping the rest.
+    """
+
+    def __init__(self, timeout_s: Optional[float] = None, parent: Optional["CancelToken"] = None):
+        self.deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        self.parent = parent
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.parent is not None and self.parent.cancelled
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the nearest deadline in the chain, None if unbounded."""
+        own = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+        inherited = None if self.parent is None else self.parent.remaining()
+        if own is None or inherited is None:
+            return inherited if own is None else own
+        return min(own, inherited)
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+
+class AllOf(CancelToken):
+    """Cancelled once every member is (members may be None = never cancelled).
+    Used for work shared by several callers, e.g. a coalesced LLM request."""
+
+    def __init__(self, tokens: Iterable[Optional[CancelToken]] = ()):
+        super().__init__()
+        self.tokens = list(tokens)
+
+    def add(self, token: Optional[CancelToken]):
+        self.tokens.append(token)
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        return bool(self.tokens) and all(t is not None and t.cancelled for t in self.tokens)
+
+    def remaining(self) -> Optional[float]:
+        left = [None if t is None else t.remaining() for t in self.tokens]
+        if not left or any(r is None for r in left):
+            return None
+        return max(left)
+
+
+def check(token: Optional[CancelToken]):
+    if token is not None:
+        token.check()
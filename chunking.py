@@ -0,0 +1,75 @@
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+# Section headings as they come out of pypdf: "3 Methods", "4.2 Ablation Study", "Results:"
+NUMBERED_HEADING = re.compile(r"^\s*\d+(?:\.\d+)*\.?\s+[A-Z][A-Za-z\- ]{2,60}$")
+NAMED_HEADING = re.compile(
+    r"^\s*(abstract|introduction|background|related work|methods?|methodology|materials and methods|"
+    r"experiments?|experimental setup|results|discussion|conclusions?|limitations)\s*:?\s*$",
+    re.IGNORECASE,
+)
+
+
+def split_sections(text: str) -> List[str]:
+    sections, current = [], []
+    for line in text.splitlines():
+        if (NUMBERED_HEADING.match(line) or NAMED_HEADING.match(line)) and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return [s for s in sections if s.strip()] or [text]
+
+
+class Chunks:
+    """Small retrieval chunks plus the array layout needed to grow them back.
+
+    Chunks are stored in document order, so the chunks of a section are a
+    contiguous id range; `section_start` holds the range boundaries, `section`
+    maps a chunk to its range and `parent` to its document. Any expansion is
+    therefore a couple of array lookups.
+    """
+
+    def __init__(self, texts: List[str], parent: np.ndarray, section: np.ndarray, section_start: np.ndarray):
+        self.texts = texts
+        self.parent = parent
+        self.section = section
+        self.section_start = section_start
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def span(self, i: int, window: int = 1, max_section_chunks: int = 4) -> Tuple[int, int]:
+        """[start, end) chunk range to send to the LLM for a hit on chunk i: its whole
+        section when that is small, otherwise i and up to `window` neighbours on
+        each side within the same section."""
+        s = self.section[i]
+        lo, hi = self.section_start[s], self.section_start[s + 1]
+        if hi - lo <= max_section_chunks:
+            return int(lo), int(hi)
+        return int(max(lo, i - window)), int(min(hi, i + window + 1))
+
+    def text(self, start: int, end: int) -> str:
+        return " ".join(self.texts[start:end])
+
+
+def chunk_documents(documents: List[str], chunk_words: int = 120) -> Chunks:
+    texts, parent, section = [], [], []
+    section_start = [0]
+    for doc_id, doc in enumerate(documents):
+        for sec in split_sections(doc):
+            words = sec.split()
+            for i in range(0, max(len(words), 1), chunk_words):
+                texts.append(" ".join(words[i:i + chunk_words]))
+                parent.append(doc_id)
+                section.append(len(section_start) - 1)
+            section_start.append(len(texts))
+    return Chunks(
+        texts,
+        np.asarray(parent, dtype=np.int32),
+        np.asarray(section, dtype=np.int32),
+        np.asarray(section_start, dtype=np.int64),
+    )
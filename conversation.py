@@ -0,0 +1,150 @@
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from llm_helper import query_llm
+from llm_scheduler import BACKGROUND
+
+# Cues that a question depends on earlier turns ("what about the second one?")
+FOLLOW_UP = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|above|previous|same|"
+    r"what about|how about|and the|the (first|second|third|fourth|fifth|last) (one|paper|doc))\b",
+    re.IGNORECASE,
+)
+ORDINALS = {"first": 0, "second": 1, "third": 2, "fourth": 3, "fifth": 4, "last": -1}
+ORDINAL_REF = re.compile(r"\b(first|second|third|fourth|fifth|last) (?:one|paper|doc|document|source)\b", re.IGNORECASE)
+DOC_REF = re.compile(r"\bdoc(?:ument)?\s*(\d+)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return max(1, len(text) // 4)
+
+
+class ConversationMemory:
+    """Rolling chat history for RAG follow-ups.
+
+    Recent turns are kept verbatim up to `max_recent_tokens`; older turns are
+    folded into a running summary one at a time (summary + evicted turn -> new
+    summary), so the conversation is never re-summarised from scratch and the
+    history block in the prompt stays bounded. Folding runs in a background
+    thread at BACKGROUND priority, off the answer's critical path; turns still
+    being folded stay in the history verbatim until the new summary is ready.
+
+    It also pins the sources shown to the LLM: later turns keep earlier sources
+    in the same order and wording and append new ones, so consecutive prompts
+    share a long identical prefix (see RAGPipeline._prompt).
+    """
+
+    def __init__(self, max_recent_tokens: int = 800, max_summary_words: int = 150, max_pinned: int = 12):
+        self.max_recent_tokens = max_recent_tokens
+        self.max_summary_words = max_summary_words
+        self.max_pinned = max_pinned
+        self.summary = ""
+        self.recent: List[Dict[str, str]] = []
+        self.evicted: List[Dict[str, str]] = []  # waiting to be folded into the summary
+        self._folding = None
+        self._lock = threading.Lock()
+        self.last_hits: List[str] = []
+        self.pinned_sources: List[str] = []  # original texts
+        self.pinned: List[str] = []          # as shown in the prompt
+
+    def is_empty(self) -> bool:
+        return not self.summary and not self.recent and not self.evicted
+
+    def rewrite_query(self, question: str) -> str:
+        """Retrieval query for a possibly elliptical follow-up, without an LLM call:
+        resolves "the second one" / "Doc 2" to the previous answer's sources and
+        carries over the previous question when the new one leans on it."""
+        parts = [question]
+
+        refs = [ORDINALS[m.lower()] for m in ORDINAL_REF.findall(question)]
+        refs += [int(n) - 1 for n in DOC_REF.findall(question)]
+        for ref in refs:
+            if -len(self.last_hits) <= ref < len(self.last_hits):
+                parts.append(self.last_hits[ref][:300])
+
+        last_question = next((m["content"] for m in reversed(self.recent) if m["role"] == "user"), None)
+        if last_question and (refs or FOLLOW_UP.search(question) or len(question.split()) < 6):
+            parts.append(last_question)
+        return " ".join(parts)
+
+    def context_docs(self, hits, transform: Optional[Callable[[List[str]], List[str]]] = None) -> Tuple[List[str], List[int]]:
+        """Sources for this turn's prompt: the pinned ones plus any new hits
+        (passed through `transform`, e.g. compression, once when first pinned),
+        and the positions of this turn's hits among them. Starts over from the
+        current hits once more than `max_pinned` pile up."""
+        hit_docs = [doc for doc, _ in hits]
+        new = [doc for doc in dict.fromkeys(hit_docs) if doc not in self.pinned_sources]
+        if len(self.pinned_sources) + len(new) > self.max_pinned:
+            self.pinned_sources, self.pinned = [], []
+            new = list(dict.fromkeys(hit_docs))
+        if new:
+            self.pinned_sources += new
+            self.pinned += transform(new) if transform is not None else new
+        return list(self.pinned), [self.pinned_sources.index(doc) for doc in hit_docs]
+
+    def context_block(self) -> str:
+        lines = []
+        with self._lock:
+            if self.summary:
+                lines.append(f"Summary of earlier conversation: {self.summary}")
+            turns = self.evicted + self.recent
+        for msg in turns:
+            lines.append(f"{msg['role'].capitalize()}: {msg['content']}")
+        return "\n".join(lines)
+
+    def add_turn(self, question: str, answer: str, hits, config: dict):
+        self.recent.append({"role": "user", "content": question})
+        self.recent.append({"role": "assistant", "content": answer})
+        self.last_hits = [doc for doc, _ in hits]
+
+        # Keep at least the latest exchange verbatim
+        with self._lock:
+            while len(self.recent) > 2 and self._recent_tokens() > self.max_recent_tokens:
+                self.evicted.extend(self.recent[:2])
+                self.recent = self.recent[2:]
+            if self.evicted and self._folding is None:
+                self._folding = threading.Thread(target=self._fold_evicted, args=(config,), daemon=True)
+                self._folding.start()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until evicted turns are folded into the summary."""
+        folding = self._folding
+        if folding is not None:
+            folding.join(timeout)
+
+    def _fold_evicted(self, config: dict):
+        while True:
+            with self._lock:
+                turns = list(self.evicted)
+                if not turns:
+                    self._folding = None
+                    return
+            summary = self._fold(turns, config)
+            with self._lock:
+                self.summary = summary
+                self.evicted = self.evicted[len(turns):]
+
+    def _recent_tokens(self) -> int:
+        return sum(estimate_tokens(m["content"]) for m in self.recent)
+
+    def _fold(self, turns: List[Dict[str, str]], config: dict) -> str:
+        transcript = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in turns)
+        prompt = f"""Update the running summary of a research Q&A conversation.
+Keep the questions asked, papers and findings mentioned, and anything left open.
+Use at most {self.max_summary_words} words.
+
+Current summary:
+{self.summary or "(empty)"}
+
+New turns:
+{transcript}
+
+Updated summary:"""
+        updated = query_llm(prompt, config, priority=BACKGROUND, kind="memory").strip()
+        if updated and not updated.startswith("Error"):
+            # The word limit in the prompt is a request, not a guarantee
+            return " ".join(updated.split()[:self.max_summary_words])
+        # Keep the history bounded even if the LLM call failed
+        return " ".join((self.summary + " " + transcript).split()[-self.max_summary_words:])
@@ -3,43 +3,78 @@ import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 from sklearn.decomposition import PCA
+from vector_store import VectorStore
+from mmr import mmr_select
 
 class EmbedCluster:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", precision: str = "float32", dims: int = None):
         self.model = SentenceTransformer(model_name)
-        self.index = None
-        self.embeddings = None
+        # Only the (possibly compressed) index is kept; RAGPipeline can share it
+        self.store = VectorStore(precision=precision, dims=dims)
         self.metadata = []
+        self.centroids = None
+        self.labels = None
+
+    @property
+    def index(self):
+        return self.store.index
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        # Decoded from the index on demand, so the float32 matrix isn't held twice
+        if self.store.index is None:
+            return None
+        return self.store.vectors()
 
     def fit(self, docs: List[str], metadata: List[Dict]):
-        self.embeddings = self.model.encode(docs, convert_to_numpy=True, normalize_embeddings=True)
-        d = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(d)  # cosine via normalized vectors
-        self.index.add(self.embeddings)
+        vectors = self.model.encode(docs, convert_to_numpy=True, normalize_embeddings=True)
+        self.store.build(vectors)  # cosine via normalized vectors
         self.metadata = metadata
 
-    def search(self, query: str, k: int = 5) -> List[Dict]:
+    def search(self, query: str, k: int = 5, allowed: np.ndarray = None) -> List[Dict]:
+        # `allowed`: optional packed row bitmap (PaperStore.filter_bitmap), applied inside the search
         q = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
-        D, I = self.index.search(q, k)
-        return [self.metadata[i] | {"score": float(D[0][j])} for j, i in enumerate(I[0])]
+        D, I = self.store.search(q, k, allowed=allowed)
+        return [self.metadata[i] | {"score": float(D[0][j])} for j, i in enumerate(I[0]) if i >= 0]
 
     def kmeans(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
-        if self.embeddings is None:
+        embeddings = self.embeddings
+        if embeddings is None:
             raise ValueError("Call fit() first.")
-        d = self.embeddings.shape[1]
+        d = embeddings.shape[1]
         
         # Safety check: K cannot be larger than number of samples
-        k = min(k, len(self.embeddings))
+        k = min(k, len(embeddings))
         
         kmeans = faiss.Kmeans(d, k, niter=25, verbose=False, spherical=True)
-        kmeans.train(self.embeddings)
-        D, I = kmeans.index.search(self.embeddings, 1)
-        return I.reshape(-1), kmeans.centroids
+        kmeans.train(embeddings)
+        D, I = kmeans.index.search(embeddings, 1)
+        self.centroids = kmeans.centroids
+        self.labels = I.reshape(-1)
+        return self.labels, kmeans.centroids
+
+    def representatives(self, cluster: int, n: int = 6, lambda_: float = 0.7) -> np.ndarray:
+        """Row ids of up to n members of `cluster` to feed a synthesis prompt: close to
+        the centroid, but penalised for redundancy with those already picked (MMR
+        with the centroid as the query). Most representative first."""
+        if self.labels is None:
+            raise ValueError("Call kmeans() first.")
+        members = np.flatnonzero(self.labels == cluster)
+        picked = mmr_select(self.centroids[cluster], self.store.vectors(members), n, lambda_)
+        return members[picked]
+
+    def route_by_clusters(self, nprobe: int = 1):
+        """Reuse the k-means centroids as a coarse quantizer: searches then only
+        scan the members of the `nprobe` nearest clusters."""
+        if self.centroids is None:
+            raise ValueError("Call kmeans() first.")
+        self.store.route(self.centroids, nprobe=nprobe)
 
     # NEW FUNCTION: Reduces dimensions for Plotly visualization
     def reduce_dimensions(self) -> np.ndarray:
-        if self.embeddings is None:
+        embeddings = self.embeddings
+        if embeddings is None:
             raise ValueError("Call fit() first.")
         # Reduce to 2 components (2D) for plotting
         pca = PCA(n_components=2)
-        return pca.fit_transform(self.embeddings)
\ No newline at end of file
+        return pca.fit_transform(embeddings)
\ No newline at end of file
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from llm_helper import query_llm
+from llm_scheduler import USER, scheduler
+from summarizer import packs, parse_json_object
+
+FIELDS = ("methods", "datasets", "metrics")
+MAX_ITEMS = 6  # per field and paper; keeps the table readable
+
+
+def _clean(value) -> List[str]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    out = []
+    for item in value:
+        item = str(item).strip().strip(".")
+        if item and item.lower() not in ("none", "n/a", "not mentioned", "unknown") and item not in out:
+            out.append(item)
+    return out[:MAX_ITEMS]
+
+
+class ExtractionCache:
+    """Extracted fields per (abstract, provider/model), shared across runs and
+    sessions, so re-running an analysis only sends papers not seen before.
+    At most `capacity` records are kept, least recently used dropped first."""
+
+    def __init__(self, capacity: int = 20000):
+        self.capacity = capacity
+        self._records: "OrderedDict[str, Dict[str, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, config: dict) -> str:
+        return hashlib.sha1(f"{config.get('provider')}|{config.get('model')}|{text}".encode("utf-8", "ignore")).hexdigest()
+
+    def get(self, text: str, config: dict) -> Optional[Dict[str, List[str]]]:
+        key = self.key(text, config)
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                self._records.move_to_end(key)
+            return record
+
+    def put(self, text: str, config: dict, record: Dict[str, List[str]]):
+        key = self.key(text, config)
+        with self._lock:
+            self._records[key] = record
+            self._records.move_to_end(key)
+            while len(self._records) > self.capacity:
+                self._records.popitem(last=False)
+
+    def missing(self, texts: List[str], config: dict) -> List[int]:
+        return [i for i, text in enumerate(texts) if self.get(text, config) is None]
+
+
+def extract_pack(texts: List[str], config: dict) -> List[Optional[Dict[str, List[str]]]]:
+    """Methods / datasets / metrics for several abstracts from one JSON-output call.
+    Entries the response lacks or garbles come back as None."""
+    ids = [f"P{i+1}" for i in range(len(texts))]
+    items = "\n\n".join(f"[{pid}] {text}" for pid, text in zip(ids, texts))
+    prompt = f"""Extract from each academic abstract below:
+- methods: models, algorithms or techniques the paper uses or proposes
+- datasets: named datasets or benchmarks
+- metrics: evaluation metrics reported
+Use short names as written in the abstract, and an empty list when nothing is mentioned.
+Return only a JSON object mapping each paper ID ({", ".join(ids)}) to
+{{"methods": [...], "datasets": [...], "metrics": [...]}}.
+
+Abstracts:
+{items}
+"""
+    parsed = parse_json_object(query_llm(prompt, config, priority=USER, kind="extraction", json_mode=True)) or {}
+    out = []
+    for pid in ids:
+        entry = parsed.get(pid)
+        out.append({f: _clean(entry.get(f)) for f in FIELDS} if isinstance(entry, dict) else None)
+    return out
+
+
+def extract_fields(texts: List[str], config: dict, cache: ExtractionCache, pack: int = 6,
+                   max_pack_tokens: int = 2500) -> List[Dict[str, List[str]]]:
+    """Extraction records for every text, in order. Only texts missing from
+    `cache` are sent, packed several per call and run concurrently up to the
+    provider's limit; a pack's missing items are retried one by one. Papers that
+    still fail get empty fields and are not cached, so the next run retries them."""
+    todo = cache.missing(texts, config)
+    workers = max(1, scheduler.limits.get(config.get("provider", "Ollama"), 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        groups = [[todo[j] for j in g] for g in packs([texts[i] for i in todo], pack, max_pack_tokens)]
+        retry = []
+        for group, records in zip(groups, pool.map(lambda g: extract_pack([texts[i] for i in g], config), groups)):
+            for i, record in zip(group, records):
+                if record is None:
+                    retry.append(i)
+                else:
+                    cache.put(texts[i], config, record)
+        for i, records in zip(retry, pool.map(lambda i: extract_pack([texts[i]], config), retry)):
+            if records[0] is not None:
+                cache.put(texts[i], config, records[0])
+
+    empty = {f: [] for f in FIELDS}
+    return [cache.get(text, config) or empty for text in texts]
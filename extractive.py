@@ -0,0 +1,87 @@
+import re
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_END.split(text) if len(s.split()) >= 4]
+
+
+def extractive_summaries(texts: List[str], labels: np.ndarray, embeddings: np.ndarray,
+                         centroids: np.ndarray, n_keywords: int = 5, n_sentences: int = 3,
+                         n_docs: int = 5) -> Dict[int, Dict]:
+    """Instant, LLM-free theme descriptions.
+
+    Keywords are the top c-TF-IDF terms of each cluster (all clusters' texts are
+    pooled per cluster and weighted against the other clusters). Sentences are
+    taken from the `n_docs` papers nearest the cluster centroid (using the
+    embeddings already computed for clustering) and ranked by their c-TF-IDF
+    mass, at most one per paper.
+
+    Returns {cluster: {"keywords": [...], "sentences": [...]}}.
+    """
+    labels = np.asarray(labels).ravel()
+    clusters = np.unique(labels)
+    vectorizer = CountVectorizer(stop_words="english", ngram_range=(1, 2), min_df=1,
+                                 token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z0-9\-]+\b")
+    try:
+        counts = vectorizer.fit_transform(texts)  # docs x terms
+    except ValueError:  # empty vocabulary: no extractable text at all (e.g. scanned PDFs)
+        return {int(c): {"keywords": [], "sentences": []} for c in clusters}
+    terms = vectorizer.get_feature_names_out()
+
+    # Class-based TF-IDF: one pseudo-document per cluster
+    row = np.searchsorted(clusters, labels)
+    onehot = sparse.csr_matrix((np.ones(len(labels)), (row, np.arange(len(labels)))),
+                               shape=(len(clusters), len(labels)))
+    class_tf = np.asarray((onehot @ counts).todense(), dtype=np.float64)
+    term_freq = class_tf.sum(axis=0)
+    avg_words = class_tf.sum() / len(clusters)
+    ctfidf = (class_tf / np.maximum(class_tf.sum(axis=1, keepdims=True), 1)) * np.log1p(avg_words / np.maximum(term_freq, 1))
+
+    # Cosine similarity of every paper to its own cluster centroid
+    cents = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    centrality = np.einsum("ij,ij->i", embeddings, cents[labels])
+
+    result = {}
+    for r, c in enumerate(clusters):
+        keywords = []
+        for t in np.argsort(-ctfidf[r]):
+            if ctfidf[r, t] <= 0:
+                break  # the cluster's own texts have no more terms
+            term = terms[t]
+            if any(term in k or k in term for k in keywords):
+                continue  # skip "graph" once "graph neural" is in, and vice versa
+            keywords.append(term)
+            if len(keywords) == n_keywords:
+                break
+
+        members = np.flatnonzero(labels == c)
+        nearest = members[np.argsort(-centrality[members])][:n_docs]
+        sentences, owners = [], []
+        for doc in nearest:
+            for sent in split_sentences(texts[doc]):
+                sentences.append(sent)
+                owners.append(doc)
+
+        picked = []
+        if sentences:
+            sent_counts = vectorizer.transform(sentences)
+            lengths = np.maximum(np.asarray(sent_counts.sum(axis=1)).ravel(), 1)
+            scores = (sent_counts @ ctfidf[r]) / np.sqrt(lengths)
+            seen = set()
+            for i in np.argsort(-scores):
+                if owners[i] in seen or sentences[i] in picked:
+                    continue
+                seen.add(owners[i])
+                picked.append(sentences[i])
+                if len(picked) == n_sentences:
+                    break
+
+        result[int(c)] = {"keywords": keywords, "sentences": picked}
+    return result
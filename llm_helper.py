@@ -2,21 +2,105 @@ import os
 import ollama
 import google.generativeai as genai
 
-def query_llm(prompt: str, config: dict) -> str:
+from cancellation import Cancelled, CancelToken, check
+from llm_router import LLMRouter
+from llm_scheduler import INTERACTIVE, scheduler
+from prompt_cache import GeminiPrefixCache
+from single_flight import SingleFlight, request_key
+
+# Identical (provider, model, prompt) requests share one upstream call
+single_flight = SingleFlight()
+# Per-backend health, timeouts and Gemini <-> Ollama failover
+router = LLMRouter()
+# Context caches for long, repeated prompt prefixes (chat sources)
+gemini_prefixes = GeminiPrefixCache()
+# Extra providers by name: generate(prompt, prefix, json_mode) -> str. Tests and
+# benchmarks register offline backends here (tests/fake_llm.py)
+BACKENDS = {}
+
+# Keep the model resident between calls instead of unloading after Ollama's 5 min default
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Ollama options per call type. num_ctx is the same everywhere on purpose: a
+# different context length makes Ollama reload the model.
+CALL_OPTIONS = {
+    "chat": {"num_ctx": 8192, "num_predict": 768},
+    "synthesis": {"num_ctx": 8192, "num_predict": 1024},
+    "summary": {"num_ctx": 8192, "num_predict": 256},
+    "summary_batch": {"num_ctx": 8192, "num_predict": 2048},
+    "extraction": {"num_ctx": 8192, "num_predict": 2048},
+    "memory": {"num_ctx": 8192, "num_predict": 256},
+}
+
+def call_options(kind: str, config: dict) -> dict:
+    """Defaults for `kind`, overridden by config["options"][kind]."""
+    return {**CALL_OPTIONS.get(kind, {}), **config.get("options", {}).get(kind, {})}
+
+def warmup(model: str, num_ctx: int = CALL_OPTIONS["chat"]["num_ctx"]) -> bool:
+    """Load `model` into Ollama's memory ahead of the first request."""
+    try:
+        ollama.generate(model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE, options={"num_ctx": num_ctx})
+        return True
+    except Exception:
+        return False
+
+def query_llm(prompt: str, config: dict, priority: int = INTERACTIVE, token: CancelToken = None,
+              kind: str = "chat", prefix: str = "", json_mode: bool = False) -> str:
     """
     Unified interface for querying LLMs (Ollama or Gemini).
     
     config dict structure:
     {
-        "provider": "Ollama" or "Gemini",
+        "provider": "Ollama", "Gemini" (or a name registered in BACKENDS),
         "model": "llama3" or "gemini-1.5-flash",
-        "api_key": "..." (only for Gemini)
+        "api_key": "..." (only for Gemini),
+        "session_id": "..." (optional, for fair sharing between sessions),
+        "failover": True/False (optional, fall back to the other provider),
+        "options": {"chat": {"num_predict": ...}, ...} (optional, Ollama options per call type)
     }
+
+    `kind` ("chat", "synthesis", "summary", "memory") picks the Ollama options.
+    `prefix` is a stable leading part of the prompt (instructions, sources) that
+    providers can cache between calls: Gemini via cached content, Ollama by
+    reusing the loaded model's KV cache for an identical system message.
+    `json_mode` asks the provider for a JSON response (callers still validate it).
+
+    Identical requests are answered from the response cache or join the call
+    already in flight; others go through the LLMRouter (timeouts, circuit
+    breaking, failover) and wait in the shared LLMScheduler for a slot on the
+    chosen provider. `priority` is one of llm_scheduler.INTERACTIVE / USER / BACKGROUND,
+    or an llm_scheduler.Priority the caller can raise later. A BACKGROUND call
+    preempted by a more urgent request goes back to the queue and starts over.
+
+    With a CancelToken the call gives up (returning cancellation.CANCELLED) as
+    soon as the token is cancelled or its deadline passes, whether it is still
+    queued or already streaming tokens.
     """
     provider = config.get("provider", "Ollama")
+
+    def send(cfg, attempt):
+        while True:
+            with scheduler.slot(cfg.get("provider", "Ollama"), priority, cfg.get("session_id", ""),
+                                token=attempt) as call:
+                attempt.start()
+                try:
+                    return _call(prompt, cfg, call, call_options(kind, cfg), prefix, json_mode)
+                except Cancelled:
+                    if attempt.cancelled:
+                        raise
+                    # Preempted for a more urgent request: queue again
+
+    key = "\0".join((kind, "json" if json_mode else "", prefix, prompt))
+    return single_flight.do(request_key(provider, config.get("model", ""), key),
+                            lambda shared: router.call(config, send, shared), token=token)
+
+def _call(prompt: str, config: dict, token: CancelToken = None, options: dict = None, prefix: str = "",
+          json_mode: bool = False) -> str:
+    provider = config.get("provider", "Ollama")
     model = config.get("model", "gemma3:latest")
     
     try:
+        # Both backends stream so a cancelled request stops between chunks
+        # (closing the stream also stops generation server-side)
         if provider == "Gemini":
             api_key = config.get("api_key")
             if not api_key:
@@ -24,18 +108,48 @@ def query_llm(prompt: str, config: dict) -> str:
             
             genai.configure(api_key=api_key)
             # gemini-1.5-flash is faster/cheaper for this use case
-            gemini_model = genai.GenerativeModel("gemini-2.5-flash") 
-            response = gemini_model.generate_content(prompt)
-            return response.text
+            gemini_model = gemini_prefixes.model(prefix, "gemini-2.5-flash", api_key) if prefix else None
+            if gemini_model is None:
+                gemini_model = genai.GenerativeModel("gemini-2.5-flash") 
+                prompt = prefix + prompt
+            remaining = None if token is None else token.remaining()
+            response = gemini_model.generate_content(
+                prompt, stream=True,
+                generation_config={"response_mime_type": "application/json"} if json_mode else None,
+                request_options={"timeout": remaining} if remaining is not None else None
+            )
+            parts = []
+            for chunk in response:
+                check(token)
+                parts.append(chunk.text)
+            return "".join(parts)
             
         elif provider == "Ollama":
             # Fallback to local
-            response = ollama.chat(
+            stream = ollama.chat(
                 model=model,
-                messages=[{"role": "user", "content": prompt}]
+                messages=([{"role": "system", "content": prefix}] if prefix else [])
+                         + [{"role": "user", "content": prompt}],
+                stream=True,
+                format="json" if json_mode else None,
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                options=options
             )
-            return response["message"]["content"]
+            parts = []
+            try:
+                for chunk in stream:
+                    check(token)
+                    parts.append(chunk["message"]["content"])
+            finally:
+                stream.close()
+            return "".join(parts)
+
+        elif provider in BACKENDS:
+            check(token)
+            return BACKENDS[provider](prompt, prefix, json_mode)
             
+    except Cancelled:
+        raise
     except Exception as e:
         return f"Error querying {provider}: {str(e)}"
     
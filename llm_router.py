@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from cancellation import CANCELLED, CancelToken, Cancelled
+
+DEFAULT_MODELS = {"Ollama": "gemma3:latest", "Gemini": "gemini-2.5-flash"}
+TIMEOUTS_S = {"Ollama": 180.0, "Gemini": 60.0}
+
+
+class ProviderHealth:
+    """Rolling latency / error rate for one provider+model, with a circuit breaker.
+
+    The circuit opens after `max_consecutive` failures in a row, or when more
+    than half of the last `window` calls failed. While open the backend is
+    skipped; after `cooldown_s` a single probe call is let through and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, window: int = 50, max_consecutive: int = 3, cooldown_s: float = 30.0):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.max_consecutive = max_consecutive
+        self.cooldown_s = cooldown_s
+        self.consecutive = 0
+        self.open_until = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self) -> Optional[str]:
+        """"closed" for a normal call, "probe" for the half-open trial call
+        (which must end in `record()` or `release_probe()`), None if open."""
+        with self._lock:
+            if self.open_until == 0.0:
+                return "closed"
+            if time.monotonic() >= self.open_until and not self.probing:
+                self.probing = True  # half-open: one trial call
+                return "probe"
+            return None
+
+    def release_probe(self):
+        """The probe ended without an outcome (cancelled): let the next call probe."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, ok: bool, latency_s: Optional[float] = None):
+        with self._lock:
+            self.outcomes.append(ok)
+            self.probing = False
+            if ok:
+                self.latencies.append(latency_s)
+                self.consecutive = 0
+                self.open_until = 0.0
+                return
+            self.consecutive += 1
+            failing = len(self.outcomes) >= 5 and self.outcomes.count(False) > len(self.outcomes) / 2
+            if self.consecutive >= self.max_consecutive or failing or self.open_until:
+                self.open_until = time.monotonic() + self.cooldown_s
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            return float(np.percentile(self.latencies, q)) if len(self.latencies) >= 5 else None
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0:
+            return "closed"
+        return "half-open" if time.monotonic() >= self.open_until else "open"
+
+
+class Attempt(CancelToken):
+    """One upstream try, cancellable on its own (a lost hedge, a timeout) or
+    through the request's token. `start()` is called by the sender once the
+    request has left the scheduler queue, so timeouts and latency exclude queueing."""
+
+    def __init__(self, config: dict, parent: Optional[CancelToken] = None):
+        super().__init__(parent=parent)
+        self.config = config
+        self.started = threading.Event()
+        self.t0 = None
+        self.abandoned = False
+        self.probe = False
+        self.future = None
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self.started.set()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.t0 if self.started.is_set() else 0.0
+
+
+class LLMRouter:
+    """Failover and hedging between LLM backends.
+
+    The configured provider is tried first. With `config["failover"]`, the
+    other provider is the backup: it is used straight away while the primary's
+    circuit is open, after the primary fails or exceeds its timeout, and as a
+    hedge when the primary runs longer than 1.5x its recent p95.
+    Responses starting with "Error" count as failures (that is how `query_llm`
+    reports them). Attempts that time out or lose a hedge are cancelled, and
+    cancelling the request's token stops all of them.
+    """
+
+    def __init__(self, timeouts_s: Optional[Dict[str, float]] = None, hedge_factor: float = 1.5,
+                 hedge_min_s: float = 5.0):
+        self.timeouts_s = dict(TIMEOUTS_S if timeouts_s is None else timeouts_s)
+        self.hedge_factor = hedge_factor
+        self.hedge_min_s = hedge_min_s
+        self._health: Dict[tuple, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def health(self, config: dict) -> ProviderHealth:
+        key = (config.get("provider"), config.get("model"))
+        with self._lock:
+            if key not in self._health:
+                self._health[key] = ProviderHealth()
+            return self._health[key]
+
+    def candidates(self, config: dict) -> List[dict]:
+        out = [config]
+        if config.get("failover"):
+            if config.get("provider") == "Gemini":
+                out.append({**config, "provider": "Ollama", "model": DEFAULT_MODELS["Ollama"]})
+            elif config.get("api_key"):
+                out.append({**config, "provider": "Gemini", "model": DEFAULT_MODELS["Gemini"]})
+        return out
+
+    def _hedge_after(self, config: dict) -> Optional[float]:
+        p95 = self.health(config).percentile(95)
+        return None if p95 is None else max(self.hedge_min_s, self.hedge_factor * p95)
+
+    def _launch(self, send: Callable[[dict, Attempt], str], config: dict,
+                token: Optional[CancelToken], probe: bool = False) -> Attempt:
+        attempt = Attempt(config, parent=token)
+        attempt.probe = probe
+        attempt.future = Future()
+        # A thread per attempt, not a bounded pool: attempts block in the scheduler,
+        # and a pool's FIFO queue would hold urgent calls behind background ones
+        threading.Thread(target=self._run, args=(send, attempt), daemon=True, name="llm-attempt").start()
+        return attempt
+
+    def _run(self, send, attempt: Attempt):
+        try:
+            result = send(attempt.config, attempt)
+        except Cancelled:
+            result = CANCELLED
+        except Exception as e:
+            result = f"Error querying {attempt.config.get('provider')}: {str(e)}"
+        health = self.health(attempt.config)
+        if attempt.abandoned:
+            pass  # already recorded as a timeout
+        elif result is CANCELLED or attempt.cancelled:
+            # No verdict on the backend (new question, lost hedge, deadline), but a
+            # half-open probe must not stay "in progress" or the circuit never closes
+            if attempt.probe:
+                health.release_probe()
+        else:
+            health.record(not result.startswith("Error"), attempt.elapsed())
+        attempt.future.set_result(result)
+
+    def call(self, config: dict, send: Callable[[dict, Attempt], str],
+             token: Optional[CancelToken] = None) -> str:
+        """Run `send(config, attempt)` against the best available backend.
+        `send` must call `attempt.start()` when the upstream request begins and
+        stop (raise Cancelled) once `attempt.cancelled` is set."""
+        backups = self.candidates(config)
+
+        def launch_next():
+            # Checked only when needed: admit() lets the half-open probe through
+            while backups:
+                candidate = backups.pop(0)
+                admitted = self.health(candidate).admit()
+                if admitted is not None:
+                    return self._launch(send, candidate, token, probe=admitted == "probe")
+            return None
+
+        if token is not None and token.cancelled:
+            return CANCELLED
+        first = launch_next()
+        if first is None:
+            return f"Error: {config.get('provider')} is unavailable (circuit open), retry shortly."
+        attempts = [first]
+        hedge_after = self._hedge_after(first.config) if backups else None
+        last_error = "Error: no response."
+        while True:
+            if token is not None and token.cancelled:
+                return CANCELLED  # the attempts see it through their parent token
+            live = []
+            for a in attempts:
+                if a.abandoned:
+                    continue
+                if a.future.done():
+                    result = a.future.result()
+                    if not result.startswith("Error"):
+                        for other in attempts:
+                            other.cancel()  # stop the losing hedge
+                        return result
+                    last_error = result
+                    a.abandoned = True
+                elif a.elapsed() > self.timeouts_s.get(a.config.get("provider"), 120.0):
+                    a.abandoned = True
+                    a.cancel()
+                    self.health(a.config).record(False)
+                    last_error = f"Error querying {a.config.get('provider')}: timed out."
+                else:
+                    live.append(a)
+
+            hedge = (backups and len(live) == 1 and hedge_after is not None
+                     and live[0].elapsed() > hedge_after)
+            if backups and (not live or hedge):
+                backup = launch_next()
+                if backup is not None:
+                    attempts.append(backup)
+                    continue
+            if not live:
+                return last_error
+            wait([a.future for a in live], timeout=0.1, return_when=FIRST_COMPLETED)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            items = list(self._health.items())
+        return {f"{provider}/{model}": {"state": h.state, "error_rate": h.error_rate(),
+                                        "p50": h.percentile(50), "p95": h.percentile(95)}
+                for (provider, model), h in items}
@@ -0,0 +1,174 @@
+import itertools
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from cancellation import CancelToken, check
+
+# Priority classes, lower runs first
+INTERACTIVE = 0  # chat answers and anything on the chat's critical path
+USER = 1         # explicit clicks (Generate Synthesis, summary tree)
+BACKGROUND = 2   # speculative / bulk work
+PRIORITY_NAMES = {INTERACTIVE: "interactive", USER: "user", BACKGROUND: "background"}
+
+DEFAULT_LIMITS = {
+    "Ollama": int(os.environ.get("OLLAMA_NUM_PARALLEL", 1)),
+    "Gemini": int(os.environ.get("GEMINI_MAX_CONCURRENCY", 4)),
+}
+
+
+class Priority:
+    """A request's priority class, held by reference so it can be raised while
+    the request waits (e.g. a user clicks a theme being synthesised in the background)."""
+
+    def __init__(self, value: int):
+        self.value = value
+
+
+class LLMScheduler:
+    """Process-wide admission control for LLM calls.
+
+    Each provider has a fixed number of slots. Waiting requests are admitted by
+    priority class first, then by fair share: the session with the fewest calls
+    running (then the fewest among the last `share_window` admissions) goes
+    next, so one session's batch cannot starve another's, and a session that
+    was busy an hour ago is not held back now. When a provider has more than one slot, background
+    work never takes the last free one, keeping headroom for chat; when every
+    slot is busy, a more urgent request preempts a running background call.
+
+    Callers block in `slot()` until admitted (or until their CancelToken fires,
+    which raises Cancelled) and run the call in their own thread.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, window: int = 200, share_window: int = 64):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = defaultdict(list)  # provider -> [(priority, seq, session)]
+        self._running = defaultdict(int)   # provider -> calls in flight
+        # Counters, not defaultdicts: looking up a waiting session must not add it
+        self._session_running = Counter()
+        self._session_admitted = Counter()       # admissions within the recent window
+        self._recent = deque()                   # sessions of the last `share_window` admissions
+        self._share_window = share_window
+        self._calls = defaultdict(dict)    # provider -> {ticket: call token} for running calls
+        self._preempting = set()           # tickets asked to give their slot back
+        self.preemptions = 0
+        self._wait_ms = defaultdict(lambda: deque(maxlen=window))   # priority -> samples
+        self._total_ms = defaultdict(lambda: deque(maxlen=window))
+
+    def _limit(self, provider: str) -> int:
+        return max(1, self.limits.get(provider, 1))
+
+    def _admissible(self, provider: str, ticket) -> bool:
+        priority = ticket[0].value
+        free = self._limit(provider) - self._running[provider]
+        if free <= 0:
+            return False
+        if priority == BACKGROUND and self._limit(provider) > 1 and free <= 1:
+            return False
+        best = min(self._waiting[provider], key=lambda t: (
+            t[0].value, self._session_running[t[2]], self._session_admitted[t[2]], t[1]))
+        return best is ticket
+
+    def _preempt(self, provider: str):
+        """Free a slot for waiting urgent requests by cancelling the most recently
+        admitted background call, unless enough slots are already being given back."""
+        if self._running[provider] < self._limit(provider):
+            return
+        urgent = sum(t[0].value < BACKGROUND for t in self._waiting[provider])
+        calls = self._calls[provider]
+        if urgent <= sum(t in self._preempting for t in calls):
+            return
+        victims = [t for t in calls if t[0].value == BACKGROUND and t not in self._preempting]
+        if victims:
+            victim = max(victims, key=lambda t: t[1])
+            self._preempting.add(victim)
+            calls[victim].cancel()
+            self.preemptions += 1
+
+    def _admitted(self, session: str):
+        self._recent.append(session)
+        self._session_admitted[session] += 1
+        if len(self._recent) > self._share_window:
+            old = self._recent.popleft()
+            self._session_admitted[old] -= 1
+            if not self._session_admitted[old]:
+                del self._session_admitted[old]  # idle sessions leave no trace
+
+    def promote(self, priority: Priority, value: int):
+        """Raise a (possibly queued) request's priority to `value`."""
+        with self._cond:
+            priority.value = min(priority.value, value)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, provider: str, priority: Union[int, Priority] = INTERACTIVE, session: str = "",
+             token: Optional[CancelToken] = None):
+        """Wait for a slot and hold it for the duration of the `with` block.
+
+        Yields the call's CancelToken: a child of `token` that the scheduler also
+        cancels to preempt a background call. A caller whose call was cancelled
+        while its own `token` was not has been preempted and should queue again.
+        """
+        if not isinstance(priority, Priority):
+            priority = Priority(priority)
+        ticket = (priority, next(self._seq), session)
+        queued = time.perf_counter()
+        with self._cond:
+            self._waiting[provider].append(ticket)
+            try:
+                while not self._admissible(provider, ticket):
+                    check(token)
+                    if priority.value < BACKGROUND:
+                        self._preempt(provider)
+                    self._cond.wait(None if token is None else 0.2)
+            finally:
+                self._waiting[provider].remove(ticket)
+                self._cond.notify_all()  # a cancelled waiter may have been next in line
+            self._running[provider] += 1
+            self._session_running[session] += 1
+            self._admitted(session)
+            self._wait_ms[priority.value].append((time.perf_counter() - queued) * 1000)
+            call = self._calls[provider][ticket] = CancelToken(parent=token)
+        try:
+            yield call
+        finally:
+            with self._cond:
+                del self._calls[provider][ticket]
+                self._preempting.discard(ticket)
+                self._running[provider] -= 1
+                self._session_running[session] -= 1
+                if not self._session_running[session]:
+                    del self._session_running[session]
+                self._total_ms[priority.value].append((time.perf_counter() - queued) * 1000)
+                self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """Queue depth and running calls per provider, wait/total latency
+        percentiles (ms) per priority class over the recent window."""
+        with self._cond:
+            providers = {p: {"queued": len(self._waiting[p]), "running": self._running[p],
+                             "limit": self._limit(p)}
+                         for p in set(self.limits) | set(self._waiting) | set(self._running)}
+            preemptions = self.preemptions
+            latency = {}
+            for priority, name in PRIORITY_NAMES.items():
+                wait, total = list(self._wait_ms[priority]), list(self._total_ms[priority])
+                if total:
+                    latency[name] = {
+                        "calls": len(total),
+                        "wait_p95": float(np.percentile(wait, 95)),
+                        "p50": float(np.percentile(total, 50)),
+                        "p95": float(np.percentile(total, 95)),
+                    }
+        return {"providers": providers, "latency": latency, "preemptions": preemptions}
+
+
+# Shared by every Streamlit session in this process
+scheduler = LLMScheduler()
@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def mmr_select(query_vec: np.ndarray, cand_vecs: np.ndarray, k: int, lambda_: float = 0.7,
+               relevance: np.ndarray = None) -> np.ndarray:
+    """Maximal marginal relevance over a candidate pool.
+
+    Greedily picks the candidate maximising
+        lambda * sim(query, c) - (1 - lambda) * max_{s in selected} sim(c, s)
+    using the vectors already in the index (no re-encoding). Each step is one
+    (n x d) @ d product, so a pool of a few hundred costs well under a millisecond.
+
+    `relevance` replaces sim(query, c) with the candidates' scores from an
+    earlier ranking stage (BM25+RRF fusion, cross-encoder), min-max scaled to
+    [0, 1]; the vectors then only measure redundancy. Without it, relevance is
+    dense cosine similarity, which would undo a lexical or reranked ordering.
+    Returns positions into `cand_vecs`, in selection order.
+    """
+    n = len(cand_vecs)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    cands = cand_vecs / np.maximum(np.linalg.norm(cand_vecs, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        q = np.ravel(query_vec)
+        relevance = cands @ (q / max(np.linalg.norm(q), 1e-12))
+    else:
+        relevance = np.asarray(relevance, dtype=cands.dtype)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=cands.dtype)
+
+    selected = np.empty(k, dtype=np.int64)
+    max_sim = np.zeros(n, dtype=cands.dtype)  # redundancy w.r.t. already-selected
+    taken = np.zeros(n, dtype=bool)
+    for step in range(k):
+        score = lambda_ * relevance - (1 - lambda_) * max_sim
+        score[taken] = -np.inf
+        best = int(np.argmax(score))
+        selected[step] = best
+        taken[best] = True
+        np.maximum(max_sim, cands @ cands[best], out=max_sim)
+    return selected
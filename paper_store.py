@@ -0,0 +1,190 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Typed columns for every paper flowing through the app. Strings that repeat a
+# lot (source, category) are dictionary-encoded; "Local File" dates become nulls.
+SCHEMA = pa.schema([
+    ("title", pa.string()),
+    ("authors", pa.list_(pa.string())),
+    ("summary", pa.string()),
+    ("published", pa.timestamp("us", tz="UTC")),
+    ("updated", pa.timestamp("us", tz="UTC")),
+    ("pdf_url", pa.string()),
+    ("entry_id", pa.string()),
+    ("primary_category", pa.dictionary(pa.int32(), pa.string())),
+    ("source", pa.dictionary(pa.int8(), pa.string())),
+    ("cluster", pa.int32()),
+    ("short_summary", pa.string()),
+])
+
+
+def _as_timestamp(value) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None  # e.g. "Local File" for uploads
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class PaperStore:
+    """Columnar paper table (pyarrow) with cached group-by indexes."""
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self._groups: Dict[str, Dict] = {}
+        self._bitmaps: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_records(cls, records: List[Dict], clusters=None) -> "PaperStore":
+        n = len(records)
+        if clusters is None:
+            clusters = [p.get("cluster", -1) for p in records]
+
+        columns = {
+            "title": [p["title"] for p in records],
+            "authors": [p.get("authors") or [] for p in records],
+            "summary": [p["summary"] for p in records],
+            "published": [_as_timestamp(p.get("published")) for p in records],
+            "updated": [_as_timestamp(p.get("updated")) for p in records],
+            "pdf_url": [p.get("pdf_url") for p in records],
+            "entry_id": [p.get("entry_id") for p in records],
+            "primary_category": [p.get("primary_category") for p in records],
+            "source": [p.get("source", "Arxiv") for p in records],
+            "cluster": np.asarray(clusters, dtype=np.int32).reshape(n),
+            # Default short summary is just title until AI generates one
+            "short_summary": [p.get("short_summary") or p["title"] for p in records],
+        }
+        arrays = []
+        for field in SCHEMA:
+            values = columns[field.name]
+            if pa.types.is_dictionary(field.type):
+                arr = pa.array(values, type=pa.string()).dictionary_encode()
+                arrays.append(arr.cast(field.type))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return cls(pa.Table.from_arrays(arrays, schema=SCHEMA))
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def column(self, name: str) -> pa.ChunkedArray:
+        if name == "year":
+            return pc.year(self.table.column("published")).cast(pa.int16())
+        return self.table.column(name)
+
+    def set_column(self, name: str, values) -> None:
+        arr = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values)
+        idx = self.table.schema.get_field_index(name)
+        if idx < 0:
+            self.table = self.table.append_column(name, arr)
+        else:
+            self.table = self.table.set_column(idx, name, arr)
+        stale = {name, "year"} if name == "published" else {name}
+        for col in stale:
+            self._groups.pop(col, None)
+        self._bitmaps = {key: bm for key, bm in self._bitmaps.items() if key[0] not in stale}
+
+    def set_list_columns(self, records: List[Dict[str, List[str]]], fields) -> None:
+        """Typed list<string> columns from per-row records (e.g. extracted datasets)."""
+        for name in fields:
+            self.set_column(name, pa.array([r.get(name) or [] for r in records], type=pa.list_(pa.string())))
+
+    def has_columns(self, names) -> bool:
+        return all(self.table.schema.get_field_index(n) >= 0 for n in names)
+
+    def value_counts(self, name: str) -> Dict[str, int]:
+        """Occurrences of each item of a list column, most frequent first."""
+        counts = pc.value_counts(pc.list_flatten(self.table.column(name)))
+        pairs = zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist())
+        return dict(sorted(pairs, key=lambda kv: -kv[1]))
+
+    def group(self, name: str) -> Dict:
+        """Row indices per distinct value of a column (computed once, then cached).
+        Nulls are grouped under None."""
+        if name not in self._groups:
+            encoded = pc.dictionary_encode(self.column(name).combine_chunks())
+            if pa.types.is_dictionary(encoded.type.value_type):
+                encoded = pc.dictionary_encode(encoded.dictionary_decode())
+            codes = pc.fill_null(encoded.indices, -1).to_numpy(zero_copy_only=False)
+            keys = encoded.dictionary.to_pylist()
+
+            order = np.argsort(codes, kind="stable")
+            present, starts = np.unique(codes[order], return_index=True)
+            chunks = np.split(order, starts[1:])
+            self._groups[name] = {
+                (keys[c] if c >= 0 else None): rows for c, rows in zip(present.tolist(), chunks)
+            }
+        return self._groups[name]
+
+    def bitmap(self, name: str, value) -> np.ndarray:
+        """Packed row bitmap (little bit order, as FAISS IDSelectorBitmap expects)
+        of rows where `name == value`. Cached per (column, value)."""
+        key = (name, value)
+        if key not in self._bitmaps:
+            mask = np.zeros(len(self), dtype=bool)
+            rows = self.group(name).get(value)
+            if rows is not None:
+                mask[rows] = True
+            self._bitmaps[key] = np.packbits(mask, bitorder="little")
+        return self._bitmaps[key]
+
+    def filter_bitmap(self, source=None, cluster=None, category=None, year=None) -> Optional[np.ndarray]:
+        """Combined bitmap for the given filters, or None when nothing is filtered.
+
+        Each filter takes a value or a list of values (OR-ed); `year` takes an
+        inclusive (start, end) range. Different filters are AND-ed.
+        """
+        filters = {"source": source, "cluster": cluster, "primary_category": category}
+        if year is not None:
+            start, end = year
+            filters["year"] = [y for y in self.group("year") if y is not None and start <= y <= end]
+
+        combined = None
+        for name, values in filters.items():
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            bm = np.zeros((len(self) + 7) // 8, dtype=np.uint8)
+            for value in values:
+                bm |= self.bitmap(name, value)
+            combined = bm if combined is None else combined & bm
+        return combined
+
+    def rows(self, indices=None) -> List[Dict]:
+        """Materialise rows as dicts (only for the few rows actually displayed)."""
+        table = self.table if indices is None else self.table.take(pa.array(indices))
+        return table.to_pylist()
+
+    def texts(self) -> List[str]:
+        return self.table.column("summary").to_pylist()
+
+    def table_frame(self, columns: List[str]) -> pd.DataFrame:
+        """Display frame of title, theme and the given columns; list columns are
+        joined into one string per cell."""
+        data = {"title": self.table.column("title"), "theme": pc.add(self.table.column("cluster"), 1)}
+        for name in columns:
+            col = self.table.column(name)
+            if pa.types.is_list(col.type):
+                col = pa.array(["; ".join(v) for v in col.to_pylist()], type=pa.string())
+            data[name] = col
+        return pa.table(data).to_pandas(types_mapper=pd.ArrowDtype)
+
+    def plot_frame(self, coords: np.ndarray) -> pd.DataFrame:
+        """Plotting DataFrame backed by the same Arrow buffers (no per-row Python objects)."""
+        coords = np.ascontiguousarray(coords, dtype=np.float64)
+        year = pc.cast(self.column("year"), pa.string())
+        plot = pa.table({
+            "x": pa.array(coords[:, 0]),
+            "y": pa.array(coords[:, 1]),
+            "title": self.table.column("title"),
+            "cluster": pc.cast(self.table.column("cluster"), pa.string()),
+            "source": self.table.column("source").cast(pa.string()),
+            "year": pc.fill_null(year, "Local"),
+        })
+        return plot.to_pandas(types_mapper=pd.ArrowDtype)
@@ -17,6 +17,7 @@ def parse_pdf(uploaded_file):
             "title": uploaded_file.name,
             "authors": ["User Uploaded"],
             "summary": text[:5000],  # Truncate to avoid token limits if too huge
+            "text": text,  # Full text, chunked by the RAG index
             "published": "Local File",
             "pdf_url": "#",
             "cluster": -1, # Will be assigned later
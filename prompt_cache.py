@@ -0,0 +1,89 @@
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+# Explicit context caches only pay off (and are only accepted) above a minimum size
+GEMINI_MIN_PREFIX_TOKENS = 1024
+
+
+class GeminiPrefixCache:
+    """Gemini CachedContent handles for long, repeated prompt prefixes.
+
+    A prefix is uploaded as cached content (TTL `ttl_min`) only once it has
+    been seen `min_uses` times: in a chat, any turn that retrieves a new source
+    changes the prefix, and creating a cache for a prefix that never comes back
+    costs an extra round trip plus billed storage. Later requests with a cached
+    prefix send only their suffix. Caches evicted from the LRU or replaced on
+    renewal are deleted in the background. A prefix that could not be cached is
+    remembered so it is not retried. Short prefixes are sent inline, where
+    Gemini's implicit caching can still reuse them.
+    """
+
+    def __init__(self, ttl_min: int = 10, capacity: int = 32, min_uses: int = 2):
+        self.ttl_min = ttl_min
+        self.capacity = capacity
+        self.min_uses = min_uses
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (CachedContent | None, expires)
+        self._seen: "OrderedDict[str, int]" = OrderedDict()       # key -> uses while not cached
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.created = 0
+        self.deleted = 0
+
+    def model(self, prefix: str, model_name: str, api_key: str) -> Optional[genai.GenerativeModel]:
+        """A model bound to the cached prefix, or None to send the prompt in full."""
+        if len(prefix) // 4 < GEMINI_MIN_PREFIX_TOKENS:
+            return None
+        key = hashlib.sha1(f"{api_key}\0{model_name}\0{prefix}".encode("utf-8", "ignore")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            # Renew a minute before expiry rather than race it
+            if entry is not None and entry[1] > time.monotonic() + 60:
+                self._entries.move_to_end(key)
+                if entry[0] is None:
+                    return None
+                self.hits += 1
+                return genai.GenerativeModel.from_cached_content(cached_content=entry[0])
+            if entry is None:
+                self._seen[key] = self._seen.get(key, 0) + 1
+                self._seen.move_to_end(key)
+                while len(self._seen) > self.capacity * 8:
+                    self._seen.popitem(last=False)
+                if self._seen[key] < self.min_uses:
+                    return None
+
+        try:
+            cached = caching.CachedContent.create(model=f"models/{model_name}", contents=[prefix],
+                                                  ttl=datetime.timedelta(minutes=self.ttl_min))
+        except Exception:
+            cached = None
+        with self._lock:
+            stale = [entry[0]] if entry is not None else []
+            self._seen.pop(key, None)
+            self._entries[key] = (cached, time.monotonic() + self.ttl_min * 60)
+            while len(self._entries) > self.capacity:
+                stale.append(self._entries.popitem(last=False)[1][0])
+            if cached is not None:
+                self.created += 1
+        self._delete([c for c in stale if c is not None])
+        if cached is None:
+            return None
+        return genai.GenerativeModel.from_cached_content(cached_content=cached)
+
+    def _delete(self, caches: List[caching.CachedContent]):
+        # Off the request path; caches that already expired server-side just fail to delete
+        def delete():
+            for cache in caches:
+                try:
+                    cache.delete()
+                    self.deleted += 1
+                except Exception:
+                    pass
+        if caches:
+            threading.Thread(target=delete, daemon=True).start()
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """Scores (query, passage) pairs with a CPU cross-encoder.
+
+    All uncached pairs of a query go through one batched forward pass. The
+    candidate pool shrinks or grows so that the forward pass stays within
+    `budget_ms`, based on a running estimate of the cost per pair.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 budget_ms: float = 250.0, min_pool: int = 10, max_pool: int = 100,
+                 cache_size: int = 20000):
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.budget_ms = budget_ms
+        self.min_pool = min_pool
+        self.max_pool = max_pool
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[bytes, float]" = OrderedDict()  # digest of (query, passage) -> score
+        self._lock = threading.Lock()
+        self.ms_per_pair = None  # exponential moving average
+
+    def pool_size(self, k: int) -> int:
+        """How many candidates to fetch for a final top-k, given the latency budget."""
+        if self.ms_per_pair is None:
+            pool = (self.min_pool + self.max_pool) // 2
+        else:
+            pool = int(self.budget_ms / max(self.ms_per_pair, 1e-3))
+        return max(k, min(max(pool, self.min_pool), self.max_pool))
+
+    @staticmethod
+    def _key(query: str, passage: str) -> bytes:
+        return hashlib.sha1(f"{query}\0{passage}".encode("utf-8", "ignore")).digest()
+
+    def score(self, query: str, passages: List[str]) -> np.ndarray:
+        keys = [self._key(query, p) for p in passages]
+        scores = np.empty(len(keys), dtype=np.float32)
+        with self._lock:  # shared by every session
+            missing = []
+            for j, key in enumerate(keys):
+                cached = self.cache.get(key)
+                if cached is None:
+                    missing.append(j)
+                else:
+                    scores[j] = cached
+                    self.cache.move_to_end(key)
+
+        if missing:
+            start = time.perf_counter()
+            fresh = self.model.predict([(query, passages[j]) for j in missing], batch_size=len(missing),
+                                       show_progress_bar=False, convert_to_numpy=True)
+            per_pair = (time.perf_counter() - start) * 1000 / len(missing)
+            with self._lock:
+                self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+                for j, s in zip(missing, fresh):
+                    scores[j] = self.cache[keys[j]] = float(s)
+                    self.cache.move_to_end(keys[j])
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, passages: List[str], k: int) -> List[Tuple[int, float]]:
+        """Top-k (position in `passages`, score), best first."""
+        if not passages:
+            return []
+        scores = self.score(query, passages)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(int(i), float(scores[i])) for i in order]
@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+
+class _Bucket:
+    """Cached answers for one index version: a fixed-size ring of question vectors."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries = [None] * capacity  # (scope, answer, hits)
+        self.size = 0
+        self.next = 0
+
+    def add(self, q_vec: np.ndarray, entry):
+        self.vectors[self.next] = q_vec
+        self.entries[self.next] = entry
+        self.next = (self.next + 1) % len(self.entries)
+        self.size = min(self.size + 1, len(self.entries))
+
+
+class SemanticCache:
+    """Answers keyed by question meaning rather than exact text.
+
+    A lookup embeds nothing itself: it takes the (normalised) question vector
+    already computed for retrieval and returns the answer of the most similar
+    previous question if cosine similarity >= `threshold`. Entries are grouped
+    by index version (see RAGPipeline.version), so rebuilding the index makes
+    old answers unreachable; the least recently used versions are dropped.
+    `scope` must capture everything else that changes the answer (k, filters,
+    model...), only entries with an equal scope match.
+    """
+
+    def __init__(self, threshold: float = 0.92, capacity: int = 512, max_versions: int = 8):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.max_versions = max_versions
+        self._buckets: "OrderedDict[Hashable, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, q_vec: np.ndarray, version: Hashable, scope: Hashable) -> Optional[Tuple[str, list]]:
+        q_vec = np.ravel(q_vec)
+        with self._lock:
+            bucket = self._buckets.get(version)
+            if bucket is not None and bucket.size:
+                self._buckets.move_to_end(version)
+                sims = bucket.vectors[:bucket.size] @ q_vec
+                for i in np.argsort(-sims):
+                    if sims[i] < self.threshold:
+                        break
+                    entry_scope, answer, hits = bucket.entries[i]
+                    if entry_scope == scope:
+                        self.hits += 1
+                        return answer, hits
+            self.misses += 1
+            return None
+
+    def store(self, q_vec: np.ndarray, version: Hashable, scope: Hashable, answer: str, hits: list):
+        q_vec = np.ravel(q_vec)
+        with self._lock:
+            bucket = self._buckets.get(version)
+            if bucket is None:
+                bucket = self._buckets[version] = _Bucket(len(q_vec), self.capacity)
+                while len(self._buckets) > self.max_versions:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(version)
+            bucket.add(q_vec, (scope, answer, hits))
+
+    def invalidate(self, version: Hashable = None):
+        """Drop one index version's answers, or everything."""
+        with self._lock:
+            if version is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(version, None)
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+from cancellation import CANCELLED, AllOf, CancelToken
+
+
+def request_key(provider: str, model: str, prompt: str) -> str:
+    return hashlib.sha1(f"{provider}\0{model}\0{prompt}".encode("utf-8", "ignore")).hexdigest()
+
+
+class SingleFlight:
+    """Deduplicates identical LLM requests.
+
+    A finished response is served from a small LRU cache; a request identical to
+    one still in flight waits for that call instead of sending its own, so N
+    users clicking the same theme cost one upstream call. Error responses are
+    handed to the callers already waiting but never cached.
+
+    The shared call runs with an AllOf token: it is cancelled only once every
+    caller waiting on it has been cancelled. A cancelled caller returns at once,
+    including the one that started the call: with a token, the call runs in its
+    own thread so it can outlive its starter for the others.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, tuple] = {}  # key -> (Future, AllOf)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    def do(self, key: str, fn: Callable[[CancelToken], str], token: Optional[CancelToken] = None) -> str:
+        """`fn(shared_token)` performs the upstream call."""
+        with self._lock:
+            self.calls += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            # A flight whose callers all gave up is being torn down; start afresh
+            leader = key not in self._inflight or self._inflight[key][1].cancelled
+            if leader:
+                self._inflight[key] = (Future(), AllOf())
+                self.upstream += 1
+            else:
+                self.coalesced += 1
+            future, shared = self._inflight[key]
+            shared.add(token)
+
+        if leader:
+            if token is None:
+                self._run(key, future, fn, shared)  # nobody can cancel this caller's wait
+            else:
+                threading.Thread(target=self._run, args=(key, future, fn, shared), daemon=True,
+                                 name="single-flight").start()
+        while True:
+            try:
+                return future.result(timeout=None if token is None else 0.2)
+            except FutureTimeout:  # not the builtin TimeoutError before Python 3.11
+                if token.cancelled:
+                    return CANCELLED
+
+    def _run(self, key: str, future: Future, fn: Callable[[CancelToken], str], shared: AllOf):
+        try:
+            result = fn(shared)
+        except BaseException as e:
+            with self._lock:
+                self._finish(key, future)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._finish(key, future)
+            if not result.startswith("Error"):
+                self._cache[key] = result
+                while len(self._cache) > self.capacity:
+                    self._cache.popitem(last=False)
+        future.set_result(result)
+
+    def _finish(self, key: str, future: Future):
+        if self._inflight.get(key, (None,))[0] is future:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "upstream": self.upstream, "coalesced": self.coalesced,
+                    "cache_hits": self.cache_hits, "saved": self.coalesced + self.cache_hits,
+                    "in_flight": len(self._inflight)}
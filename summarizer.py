@@ -1,4 +1,9 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 from llm_helper import query_llm
+from llm_scheduler import BACKGROUND, USER, scheduler
 
 def summary(text: str, config: dict) -> str:
     prompt = f"""Summarize this academic abstract in 3 bullet points.
@@ -6,15 +11,82 @@ Preserve key methods, datasets, and results.
 Text:
 {text}
 """
-    return query_llm(prompt, config).strip()
+    return query_llm(prompt, config, priority=BACKGROUND, kind="summary").strip()
+
+def packs(texts: list[str], max_items: int, max_tokens: int) -> list[list[int]]:
+    """Greedy groups of text indices, at most `max_items` and ~`max_tokens` each."""
+    groups, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = len(text) // 4
+        if current and (len(current) == max_items or size + tokens > max_tokens):
+            groups.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def parse_json_object(response: str):
+    """The JSON object in an LLM response (tolerates code fences and chatter), or None."""
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    if not match:
+        return None
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def packed_summary(abstracts: list[str], config: dict) -> list:
+    """Summaries of several abstracts from one JSON-output call, keyed by paper ID.
+    Entries that are missing or malformed come back as None."""
+    ids = [f"P{i+1}" for i in range(len(abstracts))]
+    items = "\n\n".join(f"[{pid}] {text}" for pid, text in zip(ids, abstracts))
+    prompt = f"""Summarize each academic abstract below in 3 bullet points.
+Preserve key methods, datasets, and results.
+Return only a JSON object mapping each paper ID ({", ".join(ids)}) to its summary as one string.
+
+Abstracts:
+{items}
+"""
+    parsed = parse_json_object(query_llm(prompt, config, priority=BACKGROUND, kind="summary_batch", json_mode=True)) or {}
+    out = []
+    for pid in ids:
+        value = parsed.get(pid)
+        if isinstance(value, list):  # bullets returned as a list
+            value = "\n".join(f"- {str(v).lstrip('-* ')}" for v in value)
+        out.append(value.strip() if isinstance(value, str) and value.strip() else None)
+    return out
+
+def batch_summary(abstracts: list[str], config: dict, pack: int = 8, max_pack_tokens: int = 3000) -> list[str]:
+    """Per-abstract summaries. With pack > 1, up to `pack` abstracts share one
+    structured-output call; any item the packed response lacks is summarized
+    on its own, so the result always has one entry per abstract."""
+    # As many requests in flight as the provider accepts (OLLAMA_NUM_PARALLEL for Ollama)
+    workers = max(1, scheduler.limits.get(config.get("provider", "Ollama"), 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if pack <= 1:
+            return list(pool.map(lambda t: summary(t, config), abstracts))
 
-def batch_summary(abstracts: list[str], config: dict) -> list[str]:
-    # In a real production app, we would parallelize this.
-    # For now, sequential is fine since we do "On Demand" summary in the new app.py
-    return [summary(t, config) for t in abstracts]
+        groups = packs(abstracts, pack, max_pack_tokens)
+        results = [None] * len(abstracts)
+        for group, summaries in zip(groups, pool.map(lambda g: packed_summary([abstracts[i] for i in g], config), groups)):
+            for i, text in zip(group, summaries):
+                results[i] = text
+        missing = [i for i, r in enumerate(results) if r is None]
+        for i, text in zip(missing, pool.map(lambda i: summary(abstracts[i], config), missing)):
+            results[i] = text
+    return results
 
-def summarize_cluster(texts: list[str], style: str, config: dict) -> str:
-    joined_text = "\n\n".join(texts[:10]) # Limit to top 10 to avoid token overflow
+def summarize_cluster(texts: list[str], style: str, config: dict, priority: int = USER, token=None,
+                      compressor=None) -> str:
+    # Callers pass the most representative texts first (see EmbedCluster.representatives)
+    texts = texts[:10] # Limit to top 10 to avoid token overflow
+    if compressor is not None and config.get("compress_tokens"):
+        # Keep the sentences closest to the theme's centroid, within the budget
+        texts = compressor.compress(texts, config["compress_tokens"])
+    joined_text = "\n\n".join(texts)
     
     if style == "Bullets":
         prompt_style = "a concise bulleted list"
@@ -28,4 +100,4 @@ def summarize_cluster(texts: list[str], style: str, config: dict) -> str:
     {joined_text}
     """
     
-    return query_llm(prompt, config)
\ No newline at end of file
+    return query_llm(prompt, config, priority=priority, token=token, kind="synthesis")
\ No newline at end of file
@@ -0,0 +1,96 @@
+import hashlib
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import faiss
+import numpy as np
+
+from vector_store import VectorStore
+
+# Questions about the review as a whole rather than about specific papers. Only
+# whole-corpus cues count: "what is the main result on DS-0007" or "summarize
+# the GNN paper" are about one paper and keep all their document slots.
+GLOBAL_QUESTION = re.compile(
+    r"\b(overall|across|in general|research landscape|(main|common|recurring|key|emerging) (themes|trends)|"
+    r"open (problems|questions|challenges)|research gaps|"
+    r"(all|all of|each of) (these|the) (papers|studies|works)|these (papers|studies|works)|"
+    r"the (whole|entire) (review|corpus|collection)|the (literature|field) as a whole)\b",
+    re.IGNORECASE,
+)
+
+
+def is_global_question(question: str) -> bool:
+    return bool(GLOBAL_QUESTION.search(question))
+
+
+def _checked(summaries) -> List[str]:
+    summaries = list(summaries)
+    for text in summaries:
+        if not text or text.startswith("Error"):
+            raise RuntimeError(text or "Error: empty summary.")
+    return summaries
+
+
+class SummaryTree:
+    """RAPTOR-style summary hierarchy over the existing clusters.
+
+    Level 1 holds one summary per EmbedCluster cluster, level 2 summarises groups
+    of nearby clusters (k-means over the cluster centroids) and level 3 is a
+    single summary of the whole review. Nodes are embedded into their own small
+    index, so a global question retrieves a few summary nodes instead of
+    requiring a map over every paper.
+
+    `build` raises RuntimeError if any summary call fails, so error strings
+    never become nodes; the caller keeps no tree and can retry.
+    """
+
+    def __init__(self):
+        self.nodes: List[Dict] = []  # {"level", "title", "text"}
+        self.store = None
+        self.version = None
+
+    def build(self, cluster_texts: Dict[int, List[str]], centroids: np.ndarray,
+              summarize: Callable[[List[str]], str], embedder, max_workers: int = 4) -> "SummaryTree":
+        clusters = sorted(cluster_texts)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            leaf_summaries = _checked(pool.map(lambda c: summarize(cluster_texts[c]), clusters))
+        self.nodes = [{"level": 1, "title": f"Theme {c+1}", "text": text}
+                      for c, text in zip(clusters, leaf_summaries)]
+
+        top_summaries = leaf_summaries
+        if len(clusters) >= 4:
+            # Group nearby clusters by their centroids
+            n_groups = max(2, round(math.sqrt(len(clusters))))
+            cents = np.ascontiguousarray(centroids[clusters], dtype=np.float32)
+            kmeans = faiss.Kmeans(cents.shape[1], n_groups, niter=25, verbose=False, spherical=True)
+            kmeans.train(cents)
+            _, assign = kmeans.index.search(cents, 1)
+            groups = [[i for i, g in enumerate(assign.ravel()) if g == gid] for gid in range(n_groups)]
+            groups = [g for g in groups if g]
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                top_summaries = _checked(pool.map(lambda g: summarize([leaf_summaries[i] for i in g]), groups))
+            for g, text in zip(groups, top_summaries):
+                themes = ", ".join(str(clusters[i] + 1) for i in g)
+                self.nodes.append({"level": 2, "title": f"Themes {themes}", "text": text})
+
+        root = _checked([summarize(top_summaries)])[0]
+        self.nodes.append({"level": 3, "title": "Whole review", "text": root})
+
+        texts = [n["text"] for n in self.nodes]
+        vectors = embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        self.store = VectorStore().build(vectors)
+        self.version = hashlib.sha1("\0".join(texts).encode("utf-8", "ignore")).hexdigest()
+        return self
+
+    @property
+    def root(self) -> str:
+        return self.nodes[-1]["text"] if self.nodes else ""
+
+    def search(self, q_vecs: np.ndarray, k: int = 2) -> List[List[tuple]]:
+        """Per query, the top-k summary nodes as (text, score) hits."""
+        scores, ids = self.store.search(q_vecs, min(k, len(self.nodes)))
+        return [[(f"[Summary: {self.nodes[i]['title']}] {self.nodes[i]['text']}", float(s))
+                 for i, s in zip(row_ids, row_scores) if i >= 0]
+                for row_ids, row_scores in zip(ids, scores)]
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Optional
+
+from cancellation import CANCELLED, CancelToken
+from llm_scheduler import BACKGROUND, USER, Priority, scheduler
+from summarizer import summarize_cluster
+
+
+def content_digest(texts: List[str]) -> str:
+    """Digest of a cluster's texts; compute once per analysis run and pass it on."""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8", "ignore"))
+    return digest.hexdigest()
+
+
+def synthesis_key(texts: List[str], style: str, config: dict, digest: Optional[str] = None) -> str:
+    """Cache key: (cluster contents, style, provider/model, context budget).
+    `digest` is content_digest(texts), when already known."""
+    digest = digest or content_digest(texts)
+    return hashlib.sha1(f"{style}|{config.get('provider')}|{config.get('model')}|"
+                        f"{config.get('compress_tokens')}|{digest}".encode()).hexdigest()
+
+
+class _Job:
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self.token = CancelToken()
+        self.priority = Priority(BACKGROUND)
+        self.owners = Counter()  # session id -> references (submits, waiting clicks)
+
+
+class SynthesisPrefetcher:
+    """Speculatively synthesises every theme in the background once the pipeline
+    has finished, so 'Generate Synthesis' is usually instant.
+
+    Jobs run on a small dedicated pool at BACKGROUND priority, so the LLM
+    scheduler admits chat requests and explicit clicks ahead of them (and
+    preempts a running job for them). Jobs are shared between sessions by
+    content key and reference-counted per session (config["session_id"]): a
+    session cancelling its keys only stops jobs no other session still wants.
+    At most `capacity` finished results are kept.
+    """
+
+    def __init__(self, max_workers: int = 2, capacity: int = 256):
+        self.capacity = capacity
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="synthesis")
+        self._jobs: "OrderedDict[str, _Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, texts: List[str], style: str, config: dict, compressor=None, digest: Optional[str] = None) -> str:
+        key = synthesis_key(texts, style, config, digest)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or not self._usable(job.future):
+                job = self._jobs[key] = _Job()
+                job.future = self._pool.submit(self._run, key, job, list(texts), style, dict(config), compressor)
+            job.owners[config.get("session_id", "")] += 1
+            self._jobs.move_to_end(key)
+            self._evict()
+        return key
+
+    @staticmethod
+    def _usable(future: Optional[Future]) -> bool:
+        if future is None or future.cancelled():
+            return False
+        return not future.done() or future.exception() is None
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if job.future.done()]
+        for key in finished[:max(0, len(self._jobs) - self.capacity)]:
+            del self._jobs[key]
+
+    def get(self, texts: List[str], style: str, config: dict, digest: Optional[str] = None) -> Optional[str]:
+        """The pre-generated synthesis if it is ready, else None."""
+        with self._lock:
+            job = self._jobs.get(synthesis_key(texts, style, config, digest))
+        if job is not None and self._usable(job.future) and job.future.done():
+            return job.future.result()
+        return None
+
+    def result(self, texts: List[str], style: str, config: dict, token: Optional[CancelToken] = None,
+               compressor=None, digest: Optional[str] = None) -> str:
+        """Synthesis for an explicit user request: joins a running or finished job
+        for the same key instead of issuing a second call. A joined job is raised
+        to USER priority; `token` only stops this caller's wait."""
+        key = synthesis_key(texts, style, config, digest)
+        session = config.get("session_id", "")
+        with self._lock:
+            job = self._jobs.get(key)
+            # A job still in the pool queue is cancelled and run right here
+            joined = job is not None and self._usable(job.future) and not job.future.cancel()
+            if joined:
+                job.owners[session] += 1
+                scheduler.promote(job.priority, USER)
+
+        if joined:
+            try:
+                while True:
+                    try:
+                        return job.future.result(timeout=None if token is None else 0.2)
+                    except FutureTimeout:
+                        if token.cancelled:
+                            return CANCELLED
+            except RuntimeError as e:
+                return str(e)
+            finally:
+                with self._lock:
+                    self._release(key, job, session)
+
+        summary = summarize_cluster(texts, style=style, config=config, token=token, compressor=compressor)
+        if not summary.startswith("Error"):
+            done = _Job()
+            done.future = Future()
+            done.future.set_result(summary)
+            with self._lock:
+                self._jobs[key] = done
+                self._evict()
+        return summary
+
+    def cancel(self, keys: List[str], session: str = ""):
+        """Drop `session`'s interest in the given jobs (e.g. its previous run).
+        Jobs nobody else wants are stopped: queued ones never start, running
+        ones are cancelled mid-call. Finished results are kept."""
+        with self._lock:
+            for key in keys:
+                job = self._jobs.get(key)
+                if job is not None:
+                    self._release(key, job, session)
+
+    def _release(self, key: str, job: _Job, session: str):
+        # Called with the lock held
+        if job.owners[session] > 0:
+            job.owners[session] -= 1
+        if any(job.owners.values()) or job.future.done():
+            return
+        if not job.future.cancel():
+            job.token.cancel()
+        if self._jobs.get(key) is job:
+            del self._jobs[key]
+
+    def _run(self, key: str, job: _Job, texts: List[str], style: str, config: dict, compressor=None) -> str:
+        summary = summarize_cluster(texts, style=style, config=config, priority=job.priority, token=job.token,
+                                    compressor=compressor)
+        if summary.startswith("Error"):
+            with self._lock:
+                if self._jobs.get(key) is job:
+                    del self._jobs[key]  # not kept; an explicit request retries
+            raise RuntimeError(summary)
+        return summary
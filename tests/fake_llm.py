@@ -0,0 +1,83 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List
+
+
+# "[P3] ..." item markers, as used by packed prompts (summarizer.batch_summary)
+ITEM_ID = re.compile(r"^\[([A-Za-z0-9_\-]+)\]", re.MULTILINE)
+# A requested per-item shape such as {"methods": [...], "datasets": [...]}
+LIST_FIELD = re.compile(r'"(\w+)": \[\.\.\.\]')
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4
+
+
+class FakeLLM:
+    """Offline stand-in for an LLM server, for tests and benchmarks
+    (register `generate` in llm_helper.BACKENDS).
+
+    It models the prompt (KV) cache of a local server such as Ollama: each of
+    `slots` parallel slots remembers the last prompt it processed, and a new
+    prompt only "processes" the part after its longest common prefix with the
+    best-matching slot. `stats()` reports how much prompt work prefix reuse saved;
+    a call counts as a prefix hit when at least half of its `prefix` was cached.
+    In JSON mode it answers with one entry per "[ID]" item in the prompt: a
+    string, or an object of lists when the prompt spells out that shape.
+    """
+
+    def __init__(self, slots: int = 4, ms_per_token: float = 0.0, ms_per_call: float = 0.0):
+        self.ms_per_token = ms_per_token
+        self.ms_per_call = ms_per_call
+        self._slots: List[str] = [""] * slots
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prefix_hits = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def generate(self, prompt: str, prefix: str = "", json_mode: bool = False) -> str:
+        full = prefix + prompt
+        with self._lock:
+            shared = [len(os.path.commonprefix([full, s])) for s in self._slots]
+            # Reuse the best-matching slot, or the least recently used one (slots are kept LRU-first)
+            slot = max(range(len(shared)), key=lambda i: (shared[i], i)) if any(shared) else 0
+            self._slots.pop(slot)
+            self._slots.append(full)
+            cached = _tokens(full[:shared[slot]])
+            self.calls += 1
+            self.prompt_tokens += _tokens(full)
+            self.cached_tokens += cached
+            self.prefix_hits += bool(prefix) and shared[slot] >= len(prefix) / 2
+        # Simulated latency: a fixed round trip plus prompt tokens not served from cache
+        if self.ms_per_token or self.ms_per_call:
+            time.sleep((self.ms_per_call + (_tokens(full) - cached) * self.ms_per_token) / 1000)
+        if json_mode:
+            fields = LIST_FIELD.findall(full)
+            return json.dumps({item: {f: [f"fake {f} of {item}"] for f in fields} if fields
+                               else f"(Fake summary of {item})" for item in ITEM_ID.findall(full)})
+        question = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        return f"(Fake answer, Doc 1) {question[:200]}"
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"calls": self.calls, "prefix_hits": self.prefix_hits,
+                    "prompt_tokens": self.prompt_tokens, "cached_tokens": self.cached_tokens,
+                    "reuse": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0}
+
+
+def install(name: str = "Fake", slots: int = 4, **kwargs) -> FakeLLM:
+    """Serve provider `name` from a fresh FakeLLM with `slots` parallel slots,
+    with a fresh response cache so earlier runs cannot answer for it."""
+    import llm_helper
+    from llm_scheduler import scheduler
+    from single_flight import SingleFlight
+
+    fake = FakeLLM(slots=slots, **kwargs)
+    llm_helper.BACKENDS[name] = fake.generate
+    llm_helper.single_flight = SingleFlight()
+    scheduler.limits[name] = slots
+    return fake
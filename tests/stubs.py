@@ -0,0 +1,22 @@
+import hashlib
+
+import numpy as np
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words stand-in for a SentenceTransformer: similar
+    wording gives similar vectors, with no model download."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        out = np.full((len(texts), self.dim), 0.01, dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int(hashlib.md5(word.encode()).hexdigest(), 16)
+                out[i, h % self.dim] += 1.0
+                out[i, (h >> 20) % self.dim] += 0.5
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out
@@ -0,0 +1,34 @@
+import numpy as np
+
+from benchmark import fixture_corpus
+from bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("Results on GPT-4 and ogbg-molhiv, the QM9 set") == ["results", "gpt-4", "ogbg-molhiv", "qm9", "set"]
+
+
+def test_bm25_finds_dataset_codes():
+    docs, queries, targets = fixture_corpus(n_docs=200, n_queries=20)
+    index = BM25Index().build(docs)
+    for query, target in zip(queries, targets):
+        ids, scores = index.search(query, k=3)
+        assert ids[0] == target
+        assert np.all(np.diff(scores) <= 0)
+    many = index.scores_many(queries)
+    assert np.allclose(many[0], index.scores(queries[0]))
+
+
+def test_bm25_mask_and_no_match():
+    docs, queries, targets = fixture_corpus(n_docs=50, n_queries=1)
+    index = BM25Index().build(docs)
+    mask = np.ones(len(docs), dtype=bool)
+    mask[targets[0]] = False
+    assert targets[0] not in index.search(queries[0], k=5, mask=mask)[0]
+    assert len(index.search("zzz qqq", k=5)[0]) == 0
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=3)
+    assert [doc for doc, _ in fused] == [1, 3, 2]
+    assert fused[0][1] == 1 / 61 + 1 / 62
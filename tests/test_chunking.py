@@ -0,0 +1,38 @@
+import numpy as np
+
+from chunking import chunk_documents
+from RAG import RAGPipeline
+from tests.stubs import HashEmbedder
+
+
+def words(n, tag):
+    return " ".join(f"{tag}{i}" for i in range(n))
+
+
+DOCS = [
+    f"Abstract\n{words(8, 'a')}\n2 Methods\n{words(40, 'm')}",
+    f"Introduction\n{words(6, 'i')}",
+]
+
+
+def test_span_small_section_and_window():
+    chunks = chunk_documents(DOCS, chunk_words=5)
+    assert chunks.parent.tolist() == [0] * 11 + [1, 1]
+    # "Abstract" + 8 words = 2 chunks: the whole section comes back
+    assert chunks.span(0) == (0, 2)
+    # The 42-word methods section has 9 chunks (2..10): i +- 1 within it
+    assert chunks.span(2) == (2, 4)
+    assert chunks.span(6) == (5, 8)
+    assert chunks.span(10) == (9, 11)
+    assert chunks.span(6, window=0) == (6, 7)
+    assert chunks.span(11) == (11, 13)
+
+
+def test_expand_merges_overlapping_spans():
+    rag = RAGPipeline(embedder=HashEmbedder())
+    rag.build_index(DOCS, chunk_words=5)
+    # Chunks 5 and 6 overlap (4-7, 5-8): one merged hit keeping the first score
+    hits = rag._expand([(5, 0.9), (6, 0.8), (11, 0.5), (0, 0.4)], k=2)
+    assert [score for _, score in hits] == [0.9, 0.5]
+    assert hits[0][0] == rag.chunks.text(4, 8)
+    assert hits[1][0] == rag.chunks.text(11, 13) == DOCS[1].replace("\n", " ")
@@ -0,0 +1,25 @@
+from compression import SentenceCompressor
+from tests.stubs import HashEmbedder
+
+FILLER = "We describe the experimental setup of the graph model in considerable detail here."
+
+
+def test_keeps_short_relevant_sentences():
+    compressor = SentenceCompressor(HashEmbedder())
+    texts = [f"{FILLER} {FILLER} AUROC reaches 0.94. {FILLER}", f"{FILLER} Training uses QM9 data."]
+    target = HashEmbedder().encode(["auroc reaches 0.94."], normalize_embeddings=True)[0]
+    out = compressor.compress(texts, budget_tokens=15, target=target)
+    assert out[0] == "AUROC reaches 0.94."
+    assert out[1]  # every text keeps its best sentence
+
+
+def test_budget_order_and_passthrough():
+    compressor = SentenceCompressor(HashEmbedder())
+    texts = [f"First point on graphs. {FILLER} Last point on graphs."] * 2
+    assert compressor.compress(texts, budget_tokens=1000) == texts
+
+    target = HashEmbedder().encode(["point on graphs"], normalize_embeddings=True)[0]
+    out = compressor.compress(texts, budget_tokens=20, target=target)
+    assert out == ["First point on graphs. Last point on graphs."] * 2  # original order kept
+    assert compressor.tokens_out < compressor.tokens_in
+    assert len(compressor._vectors) == 3  # repeated sentences are embedded once
@@ -0,0 +1,29 @@
+import threading
+import time
+
+import conversation
+from conversation import ConversationMemory
+
+
+def test_fold_runs_off_the_answer_path(monkeypatch):
+    release = threading.Event()
+
+    def slow_llm(prompt, config, **kwargs):
+        release.wait(5)
+        return "word " * 500
+
+    monkeypatch.setattr(conversation, "query_llm", slow_llm)
+    memory = ConversationMemory(max_recent_tokens=20, max_summary_words=30)
+    hits = [("Doc text", 1.0)]
+    memory.add_turn("first question " * 10, "first answer " * 10, hits, {})
+
+    start = time.monotonic()
+    memory.add_turn("second question", "second answer", hits, {})
+    assert time.monotonic() - start < 0.5
+    # Until the summary is ready the evicted turn is still in the history verbatim
+    assert "first question" in memory.context_block()
+
+    release.set()
+    memory.wait(5)
+    assert len(memory.summary.split()) == 30
+    assert "first question" not in memory.context_block()
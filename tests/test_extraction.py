@@ -0,0 +1,35 @@
+import extraction
+from extraction import ExtractionCache, extract_fields
+
+CONFIG = {"provider": "Fake", "model": "fake"}
+
+
+def test_cache_is_bounded_lru():
+    cache = ExtractionCache(capacity=2)
+    cache.put("a", CONFIG, {"methods": ["A"]})
+    cache.put("b", CONFIG, {"methods": ["B"]})
+    assert cache.get("a", CONFIG) == {"methods": ["A"]}  # "b" is now least recent
+    cache.put("c", CONFIG, {"methods": ["C"]})
+    assert cache.missing(["a", "b", "c"], CONFIG) == [1]
+    assert cache.get("a", {"provider": "Fake", "model": "other"}) is None
+
+
+def test_extract_fields_packs_retries_and_caches(monkeypatch):
+    prompts = []
+
+    def llm(prompt, config, **kwargs):
+        prompts.append(prompt)
+        if "[P2]" in prompt:  # the packed call drops the first paper and garbles the second
+            return '{"P2": "not an object", "P3": {"methods": "GNN.", "datasets": ["QM9", "QM9"], "metrics": ["none"]}}'
+        return '{"P1": {"methods": ["retried"], "datasets": [], "metrics": ["AUROC"]}}'
+
+    monkeypatch.setattr(extraction, "query_llm", llm)
+    cache = ExtractionCache()
+    texts = ["first", "second", "third"]
+    records = extract_fields(texts, CONFIG, cache, pack=3)
+    assert records[2] == {"methods": ["GNN"], "datasets": ["QM9"], "metrics": []}
+    assert records[0] == records[1] == {"methods": ["retried"], "datasets": [], "metrics": ["AUROC"]}
+    assert len(prompts) == 3  # one pack, two single retries
+
+    assert extract_fields(texts, CONFIG, cache, pack=3) == records
+    assert len(prompts) == 3  # everything served from the cache
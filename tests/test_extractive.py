@@ -0,0 +1,17 @@
+import numpy as np
+
+from extractive import extractive_summaries
+
+
+def test_empty_texts_give_empty_summaries():
+    labels = np.array([0, 0, 1])
+    embeddings = np.eye(3, 4, dtype=np.float32)
+    centroids = np.eye(2, 4, dtype=np.float32)
+    assert extractive_summaries(["", " ", ""], labels, embeddings, centroids) == {
+        0: {"keywords": [], "sentences": []}, 1: {"keywords": [], "sentences": []}}
+
+    # A cluster of empty texts next to one with text: no borrowed keywords
+    texts = ["Graph neural networks predict molecular properties well. They scale to large graphs.", "", ""]
+    result = extractive_summaries(texts, np.array([0, 1, 1]), embeddings, centroids)
+    assert any("graph" in k for k in result[0]["keywords"])
+    assert result[1] == {"keywords": [], "sentences": []}
@@ -0,0 +1,176 @@
+import threading
+import time
+
+from cancellation import Cancelled, CancelToken, check
+from llm_router import LLMRouter, ProviderHealth
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler
+
+GEMINI = {"provider": "Gemini", "model": "g", "failover": True}
+
+
+def backend(behaviour, log):
+    """send() whose result per provider is a string, or "hang" (until cancelled)."""
+    def send(cfg, attempt):
+        attempt.start()
+        provider = cfg["provider"]
+        log.append(provider)
+        if behaviour[provider] == "hang":
+            while True:
+                check(attempt)
+                time.sleep(0.01)
+        return behaviour[provider]
+    return send
+
+
+def test_fails_over_after_error():
+    router, log = LLMRouter(), []
+    send = backend({"Gemini": "Error querying Gemini: 503", "Ollama": "local answer"}, log)
+    assert router.call(GEMINI, send) == "local answer"
+    assert log == ["Gemini", "Ollama"]
+
+
+def test_timeout_cancels_attempt_and_fails_over():
+    router, log = LLMRouter(timeouts_s={"Gemini": 0.1, "Ollama": 5.0}), []
+    attempts = []
+
+    def send(cfg, attempt):
+        attempts.append(attempt)
+        return backend({"Gemini": "hang", "Ollama": "local answer"}, log)(cfg, attempt)
+
+    assert router.call(GEMINI, send) == "local answer"
+    assert attempts[0].cancelled
+    assert router.health(GEMINI).outcomes[-1] is False
+
+
+def test_timeout_without_backup():
+    router = LLMRouter(timeouts_s={"Gemini": 0.1})
+    result = router.call({**GEMINI, "failover": False}, backend({"Gemini": "hang"}, []))
+    assert result == "Error querying Gemini: timed out."
+
+
+def test_slow_primary_is_hedged():
+    router, log = LLMRouter(hedge_min_s=0.05), []
+    for _ in range(5):
+        router.health(GEMINI).record(True, 0.01)
+    attempts = []
+
+    def send(cfg, attempt):
+        attempts.append(attempt)
+        return backend({"Gemini": "hang", "Ollama": "hedged answer"}, log)(cfg, attempt)
+
+    start = time.monotonic()
+    assert router.call(GEMINI, send) == "hedged answer"
+    assert time.monotonic() - start < 1.0
+    assert attempts[0].cancelled  # the losing hedge is stopped
+
+
+def test_request_token_stops_attempts():
+    router, attempts = LLMRouter(), []
+
+    def send(cfg, attempt):
+        attempts.append(attempt)
+        return backend({"Gemini": "hang"}, [])(cfg, attempt)
+
+    token = CancelToken(timeout_s=0.1)
+    assert router.call({**GEMINI, "failover": False}, send, token).startswith("Error: request cancelled")
+    assert attempts[0].cancelled
+
+
+def test_circuit_opens_half_opens_and_closes():
+    health = ProviderHealth(cooldown_s=0.05)
+    for _ in range(3):
+        assert health.available()
+        health.record(False)
+    assert health.state == "open" and not health.available()
+
+    time.sleep(0.06)
+    assert health.state == "half-open"
+    assert health.available()      # the probe
+    assert not health.available()  # only one at a time
+    health.record(False)
+    assert health.state == "open"  # failed probe re-opens
+
+    time.sleep(0.06)
+    assert health.available()
+    health.record(True, 0.01)
+    assert health.state == "closed" and health.available()
+
+
+def test_open_circuit_is_skipped():
+    router, log = LLMRouter(), []
+    for _ in range(3):
+        router.health(GEMINI).record(False)
+    send = backend({"Gemini": "gemini answer", "Ollama": "local answer"}, log)
+    assert router.call(GEMINI, send) == "local answer"
+    assert log == ["Ollama"]
+    assert router.call({**GEMINI, "failover": False}, send).startswith("Error: Gemini is unavailable")
+
+
+def test_interactive_call_not_queued_behind_background():
+    # Attempts block in the scheduler; nothing in front of it may reorder them
+    scheduler, router = LLMScheduler({"Fake": 1}), LLMRouter()
+    config = {"provider": "Fake", "model": "f"}
+
+    def send_at(priority):
+        def send(cfg, attempt):
+            with scheduler.slot("Fake", priority, token=attempt):
+                attempt.start()
+                time.sleep(0.05)
+                return "ok"
+        return send
+
+    background = [threading.Thread(target=router.call, args=(config, send_at(BACKGROUND)), daemon=True)
+                  for _ in range(24)]
+    for thread in background:
+        thread.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    assert router.call(config, send_at(INTERACTIVE)) == "ok"
+    assert time.monotonic() - start < 0.3
+
+
+def test_cancelled_probe_does_not_stick_the_circuit():
+    router = LLMRouter()
+    config = {"provider": "Ollama", "model": "o"}
+    health = router.health(config)
+    health.cooldown_s = 0.05
+    for _ in range(3):
+        health.record(False)
+    time.sleep(0.06)
+
+    # The half-open probe is cancelled (new question / deadline) before it answers
+    token = CancelToken(timeout_s=0.1)
+    assert router.call(config, backend({"Ollama": "hang"}, []), token).startswith("Error: request cancelled")
+    time.sleep(0.05)  # the attempt thread winds down
+    assert not health.probing
+
+    assert router.call(config, backend({"Ollama": "recovered"}, [])) == "recovered"
+    assert health.state == "closed"
+
+
+def test_lost_hedge_probe_is_released():
+    router = LLMRouter(hedge_min_s=0.05)
+    for _ in range(5):
+        router.health(GEMINI).record(True, 0.01)
+    ollama = router.health({"provider": "Ollama", "model": "gemma3:latest"})
+    ollama.cooldown_s = 0.05
+    for _ in range(3):
+        ollama.record(False)
+    time.sleep(0.06)
+
+    log = []
+
+    def send(cfg, attempt):
+        attempt.start()
+        log.append(cfg["provider"])
+        if cfg["provider"] == "Gemini":
+            time.sleep(0.3)  # slow enough to be hedged, then wins
+            return "gemini answer"
+        while True:
+            check(attempt)
+            time.sleep(0.01)
+
+    assert router.call(GEMINI, send) == "gemini answer"
+    assert log == ["Gemini", "Ollama"]
+    time.sleep(0.05)
+    assert not ollama.probing and ollama.available()
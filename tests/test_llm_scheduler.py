@@ -0,0 +1,120 @@
+import threading
+import time
+
+from cancellation import Cancelled, check
+from llm_scheduler import BACKGROUND, INTERACTIVE, USER, LLMScheduler, Priority
+
+
+def hold(scheduler, priority, log, name, release, session="", requeue=False):
+    """Take a slot, record the admission, keep it until `release` is set."""
+    while True:
+        with scheduler.slot("P", priority, session) as call:
+            log.append(name)
+            try:
+                while not release.wait(0.01):
+                    check(call)
+                return
+            except Cancelled:
+                log.append(f"{name} preempted")
+                if not requeue:
+                    return
+
+
+def start(*args, **kwargs):
+    thread = threading.Thread(target=hold, args=args, kwargs=kwargs, daemon=True)
+    thread.start()
+    time.sleep(0.05)
+    return thread
+
+
+def test_interactive_preempts_background():
+    scheduler = LLMScheduler({"P": 1})
+    log, release = [], threading.Event()
+    background = start(scheduler, BACKGROUND, log, "bg", release, requeue=True)
+    chat = start(scheduler, INTERACTIVE, log, "chat", release)
+    assert log == ["bg", "bg preempted", "chat"]
+    release.set()
+    chat.join(1)
+    background.join(1)
+    assert log[-1] == "bg"  # requeued and ran again
+    assert scheduler.stats()["preemptions"] == 1
+
+
+def test_promoted_request_overtakes_background_queue():
+    scheduler = LLMScheduler({"P": 1})
+    log, release = [], threading.Event()
+    busy = threading.Event()
+    first = start(scheduler, USER, log, "running", busy)
+    start(scheduler, BACKGROUND, log, "early", release)
+    promoted = Priority(BACKGROUND)
+    start(scheduler, promoted, log, "late", release)
+    scheduler.promote(promoted, USER)
+    busy.set()
+    first.join(1)
+    time.sleep(0.05)
+    assert log[:2] == ["running", "late"]
+    release.set()
+
+
+def test_priority_order():
+    scheduler = LLMScheduler({"P": 1})
+    log, busy, done = [], threading.Event(), threading.Event()
+    done.set()
+    first = start(scheduler, USER, log, "running", busy)
+    waiters = [start(scheduler, priority, log, name, done)
+               for priority, name in ((BACKGROUND, "bg"), (USER, "user"), (INTERACTIVE, "chat"))]
+    busy.set()
+    for thread in [first] + waiters:
+        thread.join(1)
+    assert log == ["running", "chat", "user", "bg"]
+
+
+def test_fair_share_between_sessions():
+    scheduler = LLMScheduler({"P": 1})
+    log, busy, done = [], threading.Event(), threading.Event()
+    done.set()
+    first = start(scheduler, USER, log, "running", busy, session="A")
+    waiters = [start(scheduler, USER, log, f"A{i}", done, session="A") for i in range(3)]
+    waiters.append(start(scheduler, USER, log, "B0", done, session="B"))
+    busy.set()
+    for thread in [first] + waiters:
+        thread.join(1)
+    # B has had no calls yet, so it goes before A's queued batch
+    assert log == ["running", "B0", "A0", "A1", "A2"]
+
+
+def test_background_leaves_headroom():
+    scheduler = LLMScheduler({"P": 2})
+    log, release = [], threading.Event()
+    start(scheduler, BACKGROUND, log, "bg1", release)
+    start(scheduler, BACKGROUND, log, "bg2", release)
+    # The last free slot is kept for urgent work
+    assert log == ["bg1"]
+    assert scheduler.stats()["providers"]["P"] == {"queued": 1, "running": 1, "limit": 2}
+    start(scheduler, INTERACTIVE, log, "chat", release)
+    assert log == ["bg1", "chat"]
+    release.set()
+    time.sleep(0.1)
+    assert log == ["bg1", "chat", "bg2"]
+
+
+def test_single_slot_background_runs():
+    # With one slot there is no headroom to keep: background work is not starved
+    scheduler = LLMScheduler({"P": 1})
+    log, release = [], threading.Event()
+    release.set()
+    start(scheduler, BACKGROUND, log, "bg", release).join(1)
+    assert log == ["bg"]
+
+
+def test_fair_share_forgets_old_admissions():
+    scheduler = LLMScheduler({"P": 1}, share_window=4)
+    for i in range(10):
+        with scheduler.slot("P", INTERACTIVE, session="old"):
+            pass
+    for i in range(4):
+        with scheduler.slot("P", INTERACTIVE, session=f"s{i}"):
+            pass
+    # "old" fell out of the window: no entry, no penalty
+    assert dict(scheduler._session_admitted) == {"s0": 1, "s1": 1, "s2": 1, "s3": 1}
+    assert not scheduler._session_running
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import numpy as np
+
+from paper_store import PaperStore
+
+
+def papers():
+    records = [
+        {"title": "A", "summary": "a", "source": "Arxiv", "primary_category": "cs.LG",
+         "published": datetime(2021, 5, 1)},
+        {"title": "B", "summary": "b", "source": "Semantic Scholar", "primary_category": "cs.CL",
+         "published": datetime(2023, 1, 1)},
+        {"title": "C", "summary": "c", "source": "Arxiv", "primary_category": "cs.CL",
+         "published": datetime(2023, 6, 1)},
+        {"title": "D", "summary": "d", "source": "Local", "published": "Local File"},
+    ]
+    return PaperStore.from_records(records, clusters=[0, 1, 0, 1])
+
+
+def rows(bm, n):
+    return np.flatnonzero(np.unpackbits(bm, bitorder="little")[:n]).tolist()
+
+
+def test_group_indexes():
+    store = papers()
+    assert {k: v.tolist() for k, v in store.group("source").items()} == {
+        "Arxiv": [0, 2], "Semantic Scholar": [1], "Local": [3]}
+    assert {k: v.tolist() for k, v in store.group("year").items()} == {2021: [0], 2023: [1, 2], None: [3]}
+    assert store.group("primary_category")[None].tolist() == [3]
+    assert store.group("cluster") is store.group("cluster")  # cached
+
+
+def test_set_column_invalidates_groups():
+    store = papers()
+    assert rows(store.bitmap("cluster", 1), len(store)) == [1, 3]
+    store.set_column("cluster", np.array([1, 1, 0, 0], dtype=np.int32))
+    assert store.group("cluster")[1].tolist() == [0, 1]
+    assert rows(store.bitmap("cluster", 1), len(store)) == [0, 1]
+
+
+def test_filter_bitmap():
+    store = papers()
+    n = len(store)
+    assert store.filter_bitmap() is None
+    assert rows(store.filter_bitmap(source="Arxiv"), n) == [0, 2]
+    assert rows(store.filter_bitmap(source=["Arxiv", "Local"]), n) == [0, 2, 3]  # OR within a filter
+    assert rows(store.filter_bitmap(source="Arxiv", cluster=0, category="cs.CL"), n) == [2]  # AND across
+    assert rows(store.filter_bitmap(year=(2022, 2024)), n) == [1, 2]
+    assert rows(store.filter_bitmap(source="Arxiv", year=(2010, 2020)), n) == []
+    assert rows(store.filter_bitmap(source="Unknown"), n) == []
@@ -0,0 +1,52 @@
+import time
+
+import prompt_cache
+from prompt_cache import GeminiPrefixCache
+
+PREFIX = "sources " * 1000
+
+
+class FakeCache:
+    created = []
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.deleted = False
+
+    @classmethod
+    def create(cls, model, contents, ttl):
+        cache = cls(contents)
+        cls.created.append(cache)
+        return cache
+
+    def delete(self):
+        self.deleted = True
+
+
+def fake_gemini(monkeypatch):
+    FakeCache.created = []
+    monkeypatch.setattr(prompt_cache.caching, "CachedContent", FakeCache)
+    monkeypatch.setattr(prompt_cache.genai.GenerativeModel, "from_cached_content",
+                        staticmethod(lambda cached_content: cached_content))
+
+
+def test_cache_created_on_second_sighting(monkeypatch):
+    fake_gemini(monkeypatch)
+    cache = GeminiPrefixCache()
+    assert cache.model(PREFIX, "m", "key") is None  # first use goes inline
+    created = cache.model(PREFIX, "m", "key")
+    assert created is FakeCache.created[0]
+    assert cache.model(PREFIX, "m", "key") is created
+    assert (cache.created, cache.hits) == (1, 1)
+    assert cache.model("short prefix", "m", "key") is None
+
+
+def test_evicted_caches_are_deleted(monkeypatch):
+    fake_gemini(monkeypatch)
+    cache = GeminiPrefixCache(capacity=1)
+    for prefix in (PREFIX, PREFIX + "more"):
+        cache.model(prefix, "m", "key")
+        cache.model(prefix, "m", "key")
+    time.sleep(0.05)
+    first, second = FakeCache.created
+    assert first.deleted and not second.deleted
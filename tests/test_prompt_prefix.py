@@ -0,0 +1,44 @@
+from benchmark import fixture_corpus
+from conversation import ConversationMemory
+from RAG import RAGPipeline
+from tests.fake_llm import install
+from tests.stubs import HashEmbedder
+
+CONFIG = {"provider": "Fake", "model": "fake"}
+
+
+def chat(rag, questions, memory):
+    fake = install(slots=1)
+    for question in questions:
+        answer, _ = rag.answer(question, CONFIG, k=4, memory=memory)
+        assert answer.startswith("(Fake answer")
+    return fake.stats()
+
+
+def test_pinned_sources_repeat_the_prompt_prefix():
+    docs, queries, _ = fixture_corpus(n_docs=300, n_queries=6)
+    rag = RAGPipeline(hybrid=True, embedder=HashEmbedder())
+    rag.build_index(docs)
+    # Follow-ups return to the first papers, as in a real conversation
+    questions = [queries[0], queries[1], "How do these two compare?", queries[0]]
+
+    stateless = chat(rag, questions, memory=None)
+    pinned = chat(rag, questions, memory=ConversationMemory())
+
+    # Every turn after the first reuses the cached prefix of the one before
+    assert pinned["prefix_hits"] == pinned["calls"] - 1
+    assert pinned["reuse"] > stateless["reuse"] + 0.2
+
+
+def test_answer_priorities(monkeypatch):
+    import RAG
+    from llm_scheduler import BACKGROUND, INTERACTIVE
+
+    seen = []
+    monkeypatch.setattr(RAG, "query_llm", lambda prompt, config, priority, **kw: seen.append(priority) or "ok")
+    docs, queries, _ = fixture_corpus(n_docs=50, n_queries=3)
+    rag = RAGPipeline(embedder=HashEmbedder())
+    rag.build_index(docs)
+    rag.answer(queries[0], CONFIG)
+    rag.answer_many(queries[1:], CONFIG)
+    assert seen == [INTERACTIVE, BACKGROUND, BACKGROUND]
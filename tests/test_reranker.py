@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+
+import reranker
+
+
+class WordOverlap:
+    """CrossEncoder stand-in: score = shared words."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def predict(self, pairs, **kwargs):
+        return np.array([len(set(q.split()) & set(p.split())) for q, p in pairs], dtype=np.float32)
+
+
+def test_shared_cache_under_concurrency(monkeypatch):
+    monkeypatch.setattr(reranker, "CrossEncoder", WordOverlap)
+    rr = reranker.CrossEncoderReranker(cache_size=16)
+    passages = [f"graph neural network {i} variant {i % 7}" for i in range(40)]
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(30):
+                query = f"graph variant {(n + i) % 7}"
+                scores = rr.score(query, passages)
+                assert np.array_equal(scores, WordOverlap().predict([(query, p) for p in passages]))
+        except Exception as e:  # KeyError from a racing eviction
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(rr.cache) <= 16
+    assert rr.rerank("graph variant 3", passages, 2)[0][1] == 3.0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from benchmark import fixture_corpus, recall_at_k
+from mmr import mmr_select
+from RAG import RAGPipeline
+from tests.stubs import HashEmbedder
+
+
+def build(docs, **kwargs):
+    rag = RAGPipeline(hybrid=True, embedder=HashEmbedder(), **kwargs)
+    rag.build_index(docs)
+    return rag
+
+
+def test_mmr_keeps_lexical_hits():
+    # Dataset codes carry no dense signal: only the BM25 side of the fusion finds them
+    docs, queries, targets = fixture_corpus(n_docs=400, n_queries=40)
+    plain, _, _ = recall_at_k(build(docs), queries, targets, k=4)
+    diversified, _, _ = recall_at_k(build(docs, mmr_lambda=0.7), queries, targets, k=4)
+    assert plain == 1.0
+    assert diversified == plain
+
+
+def test_mmr_relevance_overrides_cosine():
+    vecs = np.eye(4, dtype=np.float32)
+    query = vecs[0]
+    # Candidate 3 is orthogonal to the query but ranked first by an earlier stage
+    picked = mmr_select(query, vecs, 2, 0.7, relevance=np.array([0.2, 0.1, 0.0, 0.9]))
+    assert picked[0] == 3
+    assert list(mmr_select(query, vecs, 1, 0.7)) == [0]
+
+
+def test_filters_map_onto_chunks():
+    docs, queries, targets = fixture_corpus(n_docs=60, n_queries=10)
+    rag = RAGPipeline(embedder=HashEmbedder())
+    rag.build_index(docs, chunk_words=8)
+    assert len(rag.units) > len(docs)
+    mask = np.zeros(len(docs), dtype=bool)
+    mask[targets[:5]] = True
+    allowed = np.packbits(mask, bitorder="little")
+    allowed_docs = {docs[i] for i in targets[:5]}
+    for question in queries:
+        hits = rag.query(question, k=3, allowed=allowed)
+        assert hits
+        # Each hit is a span of chunks of one allowed document
+        assert all(any(text in doc for doc in allowed_docs) for text, _ in hits)
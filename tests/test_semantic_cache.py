@@ -0,0 +1,28 @@
+from benchmark import fixture_corpus
+from RAG import RAGPipeline
+from semantic_cache import SemanticCache
+from tests.fake_llm import install
+from tests.stubs import HashEmbedder
+
+CONFIG = {"provider": "Fake", "model": "fake"}
+
+
+def test_similar_questions_with_different_sources_miss():
+    docs, _, _ = fixture_corpus(n_docs=300, n_queries=1)
+    rag = RAGPipeline(hybrid=True, embedder=HashEmbedder(), cache=SemanticCache(threshold=0.8))
+    rag.build_index(docs)
+    first, second = "Which results are reported on DS-0007?", "Which results are reported on DS-0150?"
+    q_vecs = rag._encode([first, second])
+    assert float(q_vecs[0] @ q_vecs[1]) >= rag.cache.threshold  # close enough to collide
+
+    fake = install()
+    answer, hits = rag.answer(first, CONFIG, k=3)
+    assert docs[7] in [doc for doc, _ in hits]
+    other, other_hits = rag.answer(second, CONFIG, k=3)
+    assert docs[150] in [doc for doc, _ in other_hits]
+    assert "DS-0150" in other and other != answer
+    assert fake.stats()["calls"] == 2
+
+    # The same question (same sources) is still served from the cache
+    assert rag.answer(first, CONFIG, k=3)[0] == answer
+    assert fake.stats()["calls"] == 2 and rag.cache.hits == 1
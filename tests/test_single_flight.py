@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CANCELLED, CancelToken
+from single_flight import SingleFlight
+
+
+def blocking_call(release, calls):
+    def fn(shared):
+        calls.append(shared)
+        while not release.wait(0.01):
+            if shared.cancelled:
+                return CANCELLED
+        return "answer"
+    return fn
+
+
+def test_identical_requests_share_one_call():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+    with ThreadPoolExecutor(5) as pool:
+        futures = [pool.submit(flight.do, "k", blocking_call(release, calls)) for _ in range(5)]
+        time.sleep(0.1)
+        release.set()
+        assert [f.result(1) for f in futures] == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.do("k", blocking_call(release, calls)) == "answer"  # served from the cache
+    stats = flight.stats()
+    assert (stats["upstream"], stats["coalesced"], stats["cache_hits"], stats["in_flight"]) == (1, 4, 1, 0)
+
+
+def test_errors_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do("k", lambda shared: "Error: boom") == "Error: boom"
+    assert flight.do("k", lambda shared: "ok") == "ok"
+    assert flight.stats()["upstream"] == 2
+
+
+def test_shared_call_survives_until_every_caller_cancels():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+    leader_token, waiter_token = CancelToken(), CancelToken()
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", blocking_call(release, calls), leader_token)
+        time.sleep(0.05)
+        waiter = pool.submit(flight.do, "k", blocking_call(release, calls), waiter_token)
+        time.sleep(0.05)
+
+        waiter_token.cancel()
+        assert waiter.result(1) == CANCELLED
+        assert not calls[0].cancelled and not leader.done()
+
+        leader_token.cancel()
+        assert leader.result(1) == CANCELLED
+        assert calls[0].cancelled
+
+    # A later caller starts a fresh flight instead of inheriting the cancellation
+    release.set()
+    assert flight.do("k", blocking_call(release, calls), CancelToken()) == "answer"
+    assert len(calls) == 2
+
+
+def test_cancelled_starter_returns_while_others_wait():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+    leader_token = CancelToken()
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", blocking_call(release, calls), leader_token)
+        time.sleep(0.05)
+        waiter = pool.submit(flight.do, "k", blocking_call(release, calls), None)
+        time.sleep(0.05)
+
+        try:
+            leader_token.cancel()
+            assert leader.result(1) == CANCELLED
+            assert not calls[0].cancelled  # still wanted by the waiter
+        finally:
+            release.set()
+        assert waiter.result(1) == "answer"
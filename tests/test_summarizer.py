@@ -0,0 +1,35 @@
+import json
+
+import summarizer
+from summarizer import batch_summary, packs, parse_json_object
+
+
+def test_parse_json_object():
+    assert parse_json_object('Sure! ```json\n{"P1": "a", "P2": ["b"]}\n``` Hope this helps.') == {"P1": "a", "P2": ["b"]}
+    assert parse_json_object('{"P1": "a",}') is None
+    assert parse_json_object("[1, 2]") is None
+    assert parse_json_object("no json here") is None
+
+
+def test_packs_respect_items_and_tokens():
+    assert packs(["x" * 40] * 5, max_items=2, max_tokens=100) == [[0, 1], [2, 3], [4]]
+    # ~10 tokens each: the 100-token budget splits before the item cap
+    assert packs(["x" * 40] * 12, max_items=20, max_tokens=100) == [list(range(10)), [10, 11]]
+    assert packs(["x" * 1000, "y"], max_items=8, max_tokens=100) == [[0], [1]]
+
+
+def test_batch_summary_falls_back_per_item(monkeypatch):
+    calls = []
+
+    def llm(prompt, config, priority=None, kind="", json_mode=False, **kwargs):
+        calls.append(kind)
+        if kind == "summary":
+            return f"single: {prompt.strip().splitlines()[-1]}"
+        # Packed reply: a list-valued entry, an empty one and a missing one
+        return "```json\n" + json.dumps({"P1": ["one", "- two"], "P2": "  ", "P3": "three"}) + "\n```"
+
+    monkeypatch.setattr(summarizer, "query_llm", llm)
+    abstracts = ["abstract A", "abstract B", "abstract C", "abstract D"]
+    out = batch_summary(abstracts, {"provider": "Fake"}, pack=4)
+    assert out == ["- one\n- two", "single: abstract B", "three", "single: abstract D"]
+    assert calls == ["summary_batch", "summary", "summary"]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from summary_tree import SummaryTree, is_global_question
+from tests.stubs import HashEmbedder
+
+
+def cluster_texts(n):
+    return {c: [f"paper {c} about topic {c}"] for c in range(n)}
+
+
+def test_build_fails_on_llm_error():
+    calls = []
+
+    def summarize(texts):
+        calls.append(texts)
+        return "Error querying Ollama: connection refused" if len(calls) == 2 else "A summary."
+
+    with pytest.raises(RuntimeError, match="connection refused"):
+        SummaryTree().build(cluster_texts(4), np.eye(4, dtype=np.float32), summarize, HashEmbedder())
+
+
+def test_build_levels():
+    tree = SummaryTree().build(cluster_texts(4), np.eye(4, dtype=np.float32),
+                               lambda texts: f"Summary of {len(texts)} texts.", HashEmbedder())
+    assert [n["level"] for n in tree.nodes].count(1) == 4
+    assert tree.nodes[-1]["level"] == 3 and tree.root
+
+
+def test_global_questions_need_whole_corpus_cues():
+    for question in ["What are the main themes?", "What open problems remain?",
+                     "How do methods differ across these papers?", "Overall, what works best?",
+                     "Summarize all of the papers"]:
+        assert is_global_question(question), question
+    for question in ["What is the main result on DS-0007?", "Summarize the GNN paper",
+                     "Which common baselines does DS-0150 use?", "What are the gaps in the DS-0007 evaluation?"]:
+        assert not is_global_question(question), question
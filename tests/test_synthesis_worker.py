@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+import synthesis_worker
+from cancellation import CANCELLED, CancelToken
+from synthesis_worker import SynthesisPrefetcher, content_digest, synthesis_key
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """summarize_cluster stand-in that blocks until `release` is set."""
+    state = {"calls": 0, "release": threading.Event(), "tokens": []}
+
+    def summarize(texts, style, config, priority=None, token=None, compressor=None):
+        state["calls"] += 1
+        state["tokens"].append(token)
+        while not state["release"].wait(0.01):
+            if token is not None and token.cancelled:
+                return CANCELLED
+        return f"synthesis of {len(texts)} texts"
+
+    monkeypatch.setattr(synthesis_worker, "summarize_cluster", summarize)
+    return state
+
+
+def config(session):
+    return {"provider": "Ollama", "model": "m", "session_id": session}
+
+
+def test_cancel_keeps_jobs_other_sessions_want(llm):
+    prefetcher = SynthesisPrefetcher()
+    key = prefetcher.submit(["a", "b"], "Bullets", config("A"))
+    assert prefetcher.submit(["a", "b"], "Bullets", config("B")) == key
+    time.sleep(0.05)
+
+    prefetcher.cancel([key], session="A")
+    assert not llm["tokens"][0].cancelled
+    llm["release"].set()
+    assert prefetcher.result(["a", "b"], "Bullets", config("B")) == "synthesis of 2 texts"
+    assert llm["calls"] == 1
+
+
+def test_last_owner_cancels_running_job(llm):
+    prefetcher = SynthesisPrefetcher()
+    key = prefetcher.submit(["a"], "Bullets", config("A"))
+    time.sleep(0.05)
+    prefetcher.cancel([key], session="A")
+    assert llm["tokens"][0].cancelled
+    assert prefetcher.get(["a"], "Bullets", config("A")) is None
+
+
+def test_joined_wait_honours_callers_token(llm):
+    prefetcher = SynthesisPrefetcher()
+    prefetcher.submit(["a"], "Bullets", config("A"))
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert prefetcher.result(["a"], "Bullets", config("B"), token=CancelToken(timeout_s=0.1)) == CANCELLED
+    assert time.monotonic() - start < 1.0
+    # The job itself keeps running for session A
+    assert not llm["tokens"][0].cancelled
+    llm["release"].set()
+
+
+def test_finished_results_are_bounded(llm):
+    llm["release"].set()
+    prefetcher = SynthesisPrefetcher(capacity=3)
+    for i in range(10):
+        prefetcher.result([str(i)], "Bullets", config("A"))
+    assert len(prefetcher._jobs) == 3
+    assert prefetcher.get(["9"], "Bullets", config("A")) == "synthesis of 1 texts"
+
+
+def test_precomputed_digest_finds_the_same_job(llm):
+    prefetcher = SynthesisPrefetcher()
+    texts = ["a", "b"]
+    digest = content_digest(texts)
+    assert synthesis_key(texts, "Bullets", config("A"), digest) == synthesis_key(texts, "Bullets", config("A"))
+    key = prefetcher.submit(texts, "Bullets", config("A"), digest=digest)
+    llm["release"].set()
+    prefetcher._jobs[key].future.result(timeout=5)
+    assert prefetcher.get(texts, "Bullets", config("A"), digest=digest) == "synthesis of 2 texts"
+    assert prefetcher.get(texts, "Paragraph", config("A"), digest=digest) is None
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from benchmark import fixture_corpus
+from tests.stubs import HashEmbedder
+from vector_store import PRECISIONS, VectorStore, compression_report
+
+
+def corpus_vectors(n_docs=300, n_queries=30):
+    docs, queries, _ = fixture_corpus(n_docs=n_docs, n_queries=n_queries)
+    embedder = HashEmbedder()
+    return (embedder.encode(docs, normalize_embeddings=True),
+            embedder.encode(queries, normalize_embeddings=True))
+
+
+def test_compression_report():
+    vectors, queries = corpus_vectors()
+    report = compression_report(vectors, queries, k=5)
+    by_mode = {(r["precision"], r["dims"]): r for r in report}
+    assert [(r["precision"], r["dims"]) for r in report] == [
+        ("float32", 384), ("float16", 384), ("int8", 384), ("pq", 384),
+        ("float32", 192), ("int8", 192), ("int8", 128)]
+
+    assert by_mode["float32", 384]["recall@5"] == 1.0
+    assert by_mode["float32", 384]["saved"] == 0
+    assert by_mode["float16", 384]["bytes"] == by_mode["float32", 384]["bytes"] // 2
+    assert by_mode["int8", 384]["bytes"] == by_mode["float32", 384]["bytes"] // 4
+    assert by_mode["int8", 128]["saved"] > by_mode["int8", 192]["saved"] > by_mode["int8", 384]["saved"]
+    assert by_mode["float16", 384]["recall@5"] >= 0.95
+    assert all(0 <= r["recall@5"] <= 1 for r in report)
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_filtered_search(precision):
+    vectors, queries = corpus_vectors()
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[::7] = True
+    allowed = np.packbits(mask, bitorder="little")
+    store = VectorStore(precision).build(vectors)
+    scores, ids = store.search(queries, 5, allowed=allowed)
+    assert ids.shape == (len(queries), 5)
+    assert np.all(ids >= 0) and np.all(mask[ids])
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+
+    # Filtered exact search equals exact search over the allowed rows only
+    subset = np.flatnonzero(mask)
+    _, truth = VectorStore("float32").build(vectors[subset]).search(queries, 5)
+    _, exact = VectorStore("float32").build(vectors).search(queries, 5, allowed=allowed)
+    assert np.array_equal(exact, subset[truth])
+
+    _, none = store.search(queries, 5, allowed=np.zeros_like(allowed))
+    assert np.all(none == -1)
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_routed_filtered_search(precision):
+    # Four well-separated clusters; queries sit in cluster 0, the filter allows only cluster 2
+    rng = np.random.default_rng(0)
+    centroids = np.eye(4, 32, dtype=np.float32)
+    labels = np.repeat(np.arange(4), 50)
+    vectors = centroids[labels] + 0.05 * rng.standard_normal((200, 32)).astype(np.float32)
+    queries = centroids[[0, 0]] + 0.05 * rng.standard_normal((2, 32)).astype(np.float32)
+
+    store = VectorStore(precision).build(vectors).route(centroids, nprobe=1)
+    allowed = np.packbits(labels == 2, bitorder="little")
+    _, ids = store.search(queries, 5, allowed=allowed)
+    assert np.all(ids >= 0) and np.all(labels[ids] == 2)
+
+    _, unfiltered = store.search(queries, 5)
+    assert np.all(labels[unfiltered] == 0)
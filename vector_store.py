@@ -0,0 +1,206 @@
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+# Storage modes for the FAISS index. Vectors are L2-normalised, so inner
+# product equals cosine similarity in every mode.
+#   float32 - exact (4 bytes/dim)
+#   float16 - scalar quantizer, 2 bytes/dim
+#   int8    - 8-bit scalar quantizer, 1 byte/dim
+#   pq      - product quantizer, ~1 byte per 8 dims
+PRECISIONS = ("float32", "float16", "int8", "pq")
+# Flat index types that accept an IDSelector inside search(); others scan the
+# allowed subset. All routed (IVF) variants accept one.
+_SELECTOR_PRECISIONS = {"float32", "float16", "int8"}
+_SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def bitmap_to_mask(bitmap: np.ndarray, n: int) -> np.ndarray:
+    """Packed (little bit order) row bitmap -> boolean mask of length n."""
+    return np.unpackbits(bitmap, count=n, bitorder="little").astype(bool)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def make_index(d: int, precision: str, n_train: int, quantizer: faiss.Index = None,
+               pq_dims_per_code: int = 8) -> faiss.Index:
+    """Flat index for `precision`, or its IVF counterpart when a coarse quantizer
+    (one vector per cluster centroid) is given."""
+    metric = faiss.METRIC_INNER_PRODUCT
+    nlist = 0 if quantizer is None else quantizer.ntotal
+    if precision == "float32":
+        if quantizer is None:
+            return faiss.IndexFlatIP(d)
+        return faiss.IndexIVFFlat(quantizer, d, nlist, metric)
+    if precision in _SQ_TYPES:
+        if quantizer is None:
+            return faiss.IndexScalarQuantizer(d, _SQ_TYPES[precision], metric)
+        return faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, _SQ_TYPES[precision], metric)
+    if precision == "pq":
+        # Codebooks need at least 2^nbits training points; small corpora get smaller codebooks
+        nbits = min(8, int(np.log2(max(n_train, 1))))
+        if nbits < 4:
+            return make_index(d, "float16", n_train, quantizer)
+        m = max(1, d // pq_dims_per_code)
+        while d % m:
+            m -= 1
+        if quantizer is None:
+            index = faiss.IndexPQ(d, m, nbits, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, m, nbits, metric)
+        index.pq.cp.min_points_per_centroid = 1  # small corpora are expected, don't warn
+        return index
+    raise ValueError(f"Unknown precision '{precision}'. Choose from {PRECISIONS}.")
+
+
+class VectorStore:
+    """Single FAISS index holding the corpus embeddings, optionally compressed.
+
+    `dims` truncates vectors to their first `dims` components (re-normalised)
+    before indexing; queries go through the same transform.
+    """
+
+    def __init__(self, precision: str = "float32", dims: Optional[int] = None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Choose from {PRECISIONS}.")
+        self.precision = precision
+        self.dims = dims
+        self.index = None
+        # Set by route(): the k-means centroids act as the IVF coarse quantizer
+        self.quantizer = None
+        self.nprobe = 1
+        self._lists = None  # inverted list of every row, when routed
+
+    def prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dims is not None:
+            vectors = vectors[:, :self.dims]
+        return _normalize(vectors)
+
+    def build(self, vectors: np.ndarray) -> "VectorStore":
+        vectors = self.prepare(vectors)
+        self.index = make_index(vectors.shape[1], self.precision, len(vectors))
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+        return self
+
+    def route(self, centroids: np.ndarray, nprobe: int = 1) -> "VectorStore":
+        """Re-index into inverted lists keyed by the given cluster centroids
+        (e.g. from EmbedCluster.kmeans), so a query scans only the members of
+        its `nprobe` nearest clusters instead of the whole corpus."""
+        vectors = self.vectors()
+        centroids = _normalize(centroids)
+        quantizer = faiss.IndexFlatIP(centroids.shape[1])
+        quantizer.add(centroids)
+
+        index = make_index(vectors.shape[1], self.precision, len(vectors), quantizer)
+        if not index.is_trained:
+            index.train(vectors)  # quantizer is already populated, only codes are trained
+        index.add(vectors)
+        index.make_direct_map()  # keeps vectors() / reconstruct working
+        _, lists = quantizer.search(vectors, 1)  # the same assignment add() made
+
+        self.quantizer, self.index, self.nprobe = quantizer, index, nprobe
+        self._lists = lists.ravel()
+        return self
+
+    @property
+    def routed(self) -> bool:
+        return self.quantizer is not None
+
+    @property
+    def ntotal(self) -> int:
+        return 0 if self.index is None else self.index.ntotal
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes taken by the stored codes."""
+        return self.index.sa_code_size() * self.index.ntotal
+
+    def search(self, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None,
+               nprobe: Optional[int] = None):
+        """(scores, ids) like faiss. `allowed` is a packed row bitmap (see
+        PaperStore.filter_bitmap); the filter is applied inside the search, so up
+        to k allowed rows come back rather than whatever survives a post-filter.
+        `nprobe` overrides the number of clusters scanned when routed; a filtered
+        routed search scans at least every cluster holding an allowed row."""
+        queries = self.prepare(queries)
+        if allowed is not None:
+            allowed = np.ascontiguousarray(allowed, dtype=np.uint8)
+            if not self.routed and self.precision not in _SELECTOR_PRECISIONS:
+                ids = np.flatnonzero(bitmap_to_mask(allowed, self.ntotal))
+                return self._search_subset(queries, k, ids)
+
+        sel = None if allowed is None else faiss.IDSelectorBitmap(self.ntotal, faiss.swig_ptr(allowed))
+        if self.routed:
+            nprobe = nprobe or self.nprobe
+            if allowed is not None:
+                nprobe = max(nprobe, self._covering_nprobe(queries, allowed))
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=nprobe)
+        elif sel is not None:
+            params = faiss.SearchParameters(sel=sel)
+        else:
+            return self.index.search(queries, k)
+        return self.index.search(queries, k, params=params)
+
+    def _covering_nprobe(self, queries: np.ndarray, allowed: np.ndarray) -> int:
+        """Smallest nprobe whose nearest clusters include, for every query, all
+        clusters that hold an allowed row (the nearest ones may hold none)."""
+        lists = np.unique(self._lists[bitmap_to_mask(allowed, self.ntotal)])
+        if len(lists) == 0:
+            return 1
+        _, order = self.quantizer.search(queries, self.quantizer.ntotal)
+        rank = np.argsort(order, axis=1)  # rank[q, list]: position of list among q's nearest
+        return int(rank[:, lists].max()) + 1
+
+    def _search_subset(self, queries: np.ndarray, k: int, ids: np.ndarray):
+        """Exact scan of the decoded vectors for `ids` only."""
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(ids) == 0:
+            return scores, labels
+
+        sims = queries @ self.vectors(ids).T
+        top = min(k, len(ids))
+        part = np.argpartition(-sims, top - 1, axis=1)[:, :top]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        scores[:, :top] = np.take_along_axis(part_scores, order, axis=1)
+        labels[:, :top] = ids[np.take_along_axis(part, order, axis=1)]
+        return scores, labels
+
+    def vectors(self, ids=None) -> np.ndarray:
+        """Decoded float32 vectors (all, or the given ids). Not kept around after use."""
+        if ids is None:
+            return self.index.reconstruct_n(0, self.index.ntotal)
+        ids = np.asarray(ids, dtype=np.int64)
+        return self.index.reconstruct_batch(ids)
+
+
+def compression_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                       modes=(("float32", None), ("float16", None), ("int8", None), ("pq", None),
+                              ("float32", 192), ("int8", 192), ("int8", 128))) -> List[Dict]:
+    """Memory and recall@k of each (precision, dims) mode against exact float32 search."""
+    exact = VectorStore("float32").build(vectors)
+    _, truth = exact.search(queries, k)
+    baseline = exact.nbytes
+
+    report = []
+    for precision, dims in modes:
+        store = VectorStore(precision, dims).build(vectors)
+        _, found = store.search(queries, k)
+        recall = np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+        report.append({
+            "precision": precision,
+            "dims": dims or vectors.shape[1],
+            "bytes": store.nbytes,
+            "saved": 1 - store.nbytes / baseline,
+            f"recall@{k}": float(recall),
+        })
+    return report